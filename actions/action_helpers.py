@@ -1,25 +1,45 @@
 from __future__ import annotations
 
-from typing import Callable
+from typing import Iterator
 
+import numpy as np
 import tcod.ecs
 
 import engine.states
 from engine.state import State
 from engine.messaging import add_message
-from actions.action import Success, Failure, ActionResult
-from constants.tags import IsPlayer, IsActor, ActiveMap, InMap
-from components.main import HP, AI
+from actions.action import Action, Success, Failure, ActionResult
+from actions.actions import StepTowards
+from constants.tags import IsPlayer, IsActor, IsAwake, ActiveMap, InMap
+from constants.game_constants import ENEMY_WAKE_RADIUS, PLAYER_REGEN_TURNS, COMMAND_TURN_LIMIT
+from components.main import HP, AI, AlertedTo, ChaseMap, Position, Name, SpatialIndex, VisibleTiles, TurnCount
+from engine.actor_helpers import wake_actors_near, put_to_sleep
+from engine.chunk_helpers import scroll_window
+from engine.timing import timed
+from mobs.combat import heal
 
 
-def do_player_action(state: State, player: tcod.ecs.Entity, action: Callable[[tcod.ecs.Entity], Success | Failure]) -> State:
-    assert IsPlayer in player.tags
-    world = player.registry
+def take_turn(player: tcod.ecs.Entity, action: Action) -> ActionResult:
+    """Have the player perform `action`. If that took their turn, everyone else gets theirs."""
     result: ActionResult = action(player)
+    if isinstance(result, Success):
+        do_enemy_actions(player.registry)
+        scroll_window(player)
+        regenerate(player)
+    return result
+
+def regenerate(player: tcod.ecs.Entity) -> None:
+    """Count a turn taken by the player, healing them a little every `PLAYER_REGEN_TURNS` turns."""
+    globals_ = player.registry[None]
+    globals_.components[TurnCount] = turn = globals_.components.get(TurnCount, 0) + 1
+    if turn % PLAYER_REGEN_TURNS == 0 and player.components[HP] > 0:
+        heal(player, 1)
 
-    match result:
-         case Success():
-              do_enemy_actions(player.registry)
+@timed("player")
+def do_player_action(state: State, player: tcod.ecs.Entity, action: Action) -> State:
+    assert IsPlayer in player.tags
+    world = player.registry
+    match take_turn(player, action):
          case Failure(reason=reason):
               add_message(world, reason, "GREY")
 
@@ -27,8 +47,67 @@ def do_player_action(state: State, player: tcod.ecs.Entity, action: Callable[[tc
          return engine.states.GameOverState(world)
     return state
 
+@timed("player")
+def do_player_command(state: State, player: tcod.ecs.Entity, command: Iterator[Action]) -> State:
+    """Take turns with the actions of a multi-turn command from `actions.commands`, without drawing in between.
+
+    Refused while a monster is in view. Stops when the command runs out of actions,
+    an action fails, the player is hurt, a monster comes into view or after
+    `COMMAND_TURN_LIMIT` turns."""
+    assert IsPlayer in player.tags
+    world = player.registry
+    monster = visible_monster(player)
+    if monster is not None:
+        add_message(world, f"Not with the {monster.components[Name]} in view.", "GREY", stack=False)
+        return state
+    for _ in range(COMMAND_TURN_LIMIT):
+        action = next(command, None)
+        if action is None:
+            break
+        hp = player.components[HP]
+        match take_turn(player, action):
+            case Failure(reason=reason):
+                add_message(world, reason, "GREY")
+                break
+        if player.components[HP] <= 0:
+            return engine.states.GameOverState(world)
+        if player.components[HP] < hp:
+            break
+        monster = visible_monster(player)
+        if monster is not None:
+            add_message(world, f"The {monster.components[Name]} comes into view.", "YELLOW")
+            break
+    return state
+
+def visible_monster(player: tcod.ecs.Entity) -> tcod.ecs.Entity | None:
+    """Return a living actor other than the player standing on a tile the player can see."""
+    map_ = player.relation_tag[InMap]
+    index = map_.components[SpatialIndex]
+    for x, y in np.argwhere(index.blocking & map_.components[VisibleTiles]).tolist():
+        actor = index.actors[x, y]
+        if actor != player:
+            return actor
+    return None
+
+@timed("enemies")
 def do_enemy_actions(r: tcod.ecs.Registry):
+        """Give every awake enemy in the active map its turn.
+
+        Dormant enemies are skipped entirely. Awake enemies near the player run their AI,
+        while those further out take a cheap greedy step towards whatever alerted them,
+        going dormant again once they get there, get stuck or were never alerted."""
         map_ = r[None].relation_tag[ActiveMap]
-        npcs = r.Q.all_of(components=[AI], tags=[IsActor], relations=[(InMap, map_)]).none_of(tags=[IsPlayer])
-        for entity in npcs:
-            entity.components[AI](entity)
+        map_.components.pop(ChaseMap, None) # the player has acted, so last turn's distances are stale
+        (player,) = r.Q.all_of(tags=[IsPlayer])
+        player_pos = player.components[Position]
+        wake_actors_near(map_, player_pos, ENEMY_WAKE_RADIUS, visible_only=True)
+        npcs = r.Q.all_of(components=[AI], tags=[IsActor, IsAwake], relations=[(InMap, map_)]).none_of(tags=[IsPlayer])
+        # queries come back in hash order, which changes between runs; act in position order so turns replay exactly
+        for entity in sorted(npcs, key=lambda e: e.components[Position].raw):
+            pos = entity.components[Position]
+            if max(abs(pos.x - player_pos.x), abs(pos.y - player_pos.y)) <= ENEMY_WAKE_RADIUS:
+                entity.components[AI](entity)
+                continue
+            alerted_to = entity.components.get(AlertedTo, None)
+            if alerted_to is None or pos == alerted_to or isinstance(StepTowards(alerted_to)(entity), Failure):
+                put_to_sleep(entity)
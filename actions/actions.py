@@ -1,6 +1,5 @@
 from __future__ import annotations
 
-import time
 from typing import Final
 
 import numpy as np
@@ -8,13 +7,14 @@ import tcod.ecs
 import tcod.ecs.entity
 
 from actions.action import Success, Failure, ActionResult
-from constants.map_constants import *
-from constants.tags import ActiveMap, IsActor, IsBlocking, IsPlayer, InMap, IsItem, InInventory, IsQuaffable
-from components.main import Name, Position, Inventory, Tiles, VisibleTiles, ExploredTiles
+from constants.game_constants import MELEE_NOISE_RADIUS
+from constants.tags import ActiveMap, IsPlayer, InMap, InInventory, IsQuaffable
+from components.main import Name, Position, Inventory, Tiles, VisibleTiles, ExploredTiles, WalkCost, SpatialIndex
+from components.main import Depth, enter_map, leave_map
+from dungeon.tiles import TileIndices
 from components.item_effects import Healing
-from dungeon.tiles import TILES
-from engine.actor_helpers import update_fov
-from engine.path_tools import path_to
+from engine.actor_helpers import update_fov, wake_actors_near
+from engine.path_tools import path_to, chase_map, step_downhill
 from engine.messaging import add_message
 from mobs.combat import melee_damage, apply_damage, heal
 
@@ -24,15 +24,13 @@ class Move:
         self.dy = dy
 
     def __call__(self, entity: tcod.ecs.Entity) -> ActionResult:
-        r = entity.registry
         map_ = entity.relation_tag[InMap]
-        map_tiles = entity.registry[None].relation_tag[ActiveMap].components[Tiles]
+        walk_cost = entity.registry[None].relation_tag[ActiveMap].components[WalkCost]
         pos = entity.components[Position]
         target = Position(pos.x + self.dx, pos.y + self.dy)
-        if TILES[map_tiles[target.x, target.y]]["walk_cost"] == 0:
+        if walk_cost[target.raw] == 0:
             return Failure("WARNING: Move action attempted into unwalkable tile.")
-        blocking = r.Q.all_of(tags=[IsActor, IsBlocking, target], relations=[(InMap, map_)]).get_entities()
-        if len(blocking) > 0:
+        if map_.components[SpatialIndex].blocking[target.raw]:
             return Failure("Something is blocking the way.")
         entity.components[Position] = target
         if IsPlayer in entity.tags:
@@ -48,9 +46,8 @@ class Melee:
         r = entity.registry
         new_pos = entity.components[Position] + (self.dx, self.dy)
         attacker_is_player = IsPlayer in entity.tags
-        try:
-            (target,) = entity.registry.Q.all_of(tags=[IsActor, new_pos])
-        except ValueError:
+        target = entity.relation_tag[InMap].components[SpatialIndex].actors.get(new_pos.raw, None)
+        if target is None:
             return Failure("Nothing there to attack.")
         defender_is_player = IsPlayer in entity.tags
         dmg = melee_damage(entity, target)
@@ -67,6 +64,7 @@ class Melee:
             color_str = "ENEMY_ATK"
         add_message(r, attack_desc, color_str)
         apply_damage(target, dmg)
+        wake_actors_near(entity.relation_tag[InMap], new_pos, MELEE_NOISE_RADIUS)
         return Success()
 
 class Bump:
@@ -79,11 +77,10 @@ class Bump:
         r = entity.registry
         pos = entity.components[Position]
         target = Position(pos.x + self.dx, pos.y + self.dy)
-        map_tiles = r[None].relation_tag[ActiveMap].components[Tiles]
-        if TILES[map_tiles[target.x, target.y]]["walk_cost"] == 0:
+        walk_cost = r[None].relation_tag[ActiveMap].components[WalkCost]
+        if walk_cost[target.raw] == 0:
             return Failure("You cannot move there.")
-        entities = r.Q.all_of(tags=[IsActor, IsBlocking, target], relations=[(InMap, map_)]).get_entities()
-        if len(entities) > 0:
+        if map_.components[SpatialIndex].blocking[target.raw]:
             return Melee(self.dx, self.dy)(entity)
         else:
             return Move(self.dx, self.dy)(entity)
@@ -93,15 +90,14 @@ class GetItem:
         map_ = entity.relation_tag[InMap]
         r = entity.registry
         at_position = entity.components[Position]
-        try:
-            item = list(r.Q.all_of(tags=[IsItem, at_position], relations=[(InMap, map_)]).get_entities())[0]
-        except IndexError as err:
-            # print(err)
+        items = map_.components[SpatialIndex].items.get(at_position.raw, None)
+        if not items:
             return Failure("There is nothing there to get.")
+        item = items[0]
         inv: Inventory = entity.components[Inventory]
         if not inv.size < inv.max_size:
             return Failure("Your inventory is full. You need to (d)rop or (q)uaff an item first.")
-        del item.relation_tag[InMap]
+        leave_map(item)
         item.relation_tag[InInventory] = entity
         inv.size += 1
         add_message(r, f"You pick up the {item.components.get(Name, "????")}. You now have {inv.size}/{inv.max_size} items.")
@@ -119,7 +115,7 @@ class DropItem:
         inv.size -= 1
         map_ = actor.relation_tag[InMap]
         item.components[Position] = actor.components[Position]
-        item.relation_tag[InMap] = map_
+        enter_map(item, map_)
         add_message(actor.registry, f"You drop the {item.components.get(Name, "????")}. You now have {inv.size}/{inv.max_size} items.")
         return Success()
 
@@ -146,6 +142,13 @@ class QuaffItem:
 class SimpleEnemy:
     def __init__(self) -> None:
         self.path: list[Position] = []
+        self.last_seen: Position | None = None
+
+    def translate(self, offset: tuple[int, int]) -> None:
+        """Move remembered positions along with the map, when a chunked map scrolls."""
+        self.path = [pos + offset for pos in self.path]
+        if self.last_seen is not None:
+            self.last_seen = self.last_seen + offset
 
     def __call__(self, actor: tcod.ecs.Entity):
         r = actor.registry
@@ -164,34 +167,70 @@ class SimpleEnemy:
         if map_.components[VisibleTiles][actor_pos.raw]:
             if distance <= 1:
                 return Melee(dx, dy)(actor)
-            self.path = path_to(actor, target_pos)
+            # descend the distance map shared by every chasing actor this turn
+            self.path = []
+            self.last_seen = target_pos
+            step = step_downhill(actor_pos, chase_map(map_, target), map_.components[SpatialIndex].blocking, target_pos)
+            if step is None:
+                return wait_action(actor)
+            return Move(step.x - actor_pos.x, step.y - actor_pos.y)(actor)
+        if self.last_seen is not None:
+            # lost sight of the target, head to where it was last seen
+            self.path = path_to(actor, self.last_seen)
+            self.last_seen = None
         if self.path:
             dest: Final = self.path.pop(0)
             return Move(dest.x - actor_pos.x, dest.y - actor_pos.y)(actor)
         return wait_action(actor)
 
 
+class StepTowards:
+    """Take one greedy step towards a position, without pathfinding.
+
+    Used for awake enemies far from the player, where a full AI turn isn't worth it."""
+    def __init__(self, dest: Position) -> None:
+        self.dest = dest
+
+    def __call__(self, actor: tcod.ecs.Entity) -> ActionResult:
+        map_ = actor.relation_tag[InMap]
+        walk_cost = map_.components[WalkCost]
+        blocking = map_.components[SpatialIndex].blocking
+        pos = actor.components[Position]
+        dx = (self.dest.x > pos.x) - (self.dest.x < pos.x)
+        dy = (self.dest.y > pos.y) - (self.dest.y < pos.y)
+        for step in ((dx, dy), (dx, 0), (0, dy)):
+            if step == (0, 0):
+                continue
+            target = pos + step
+            if walk_cost[target.raw] and not blocking[target.raw]:
+                return Move(*step)(actor)
+        return Failure("No greedy step available.")
+
+
+class TakeStairs:
+    def __init__(self, dz: int) -> None:
+        self.dz = dz # +1 to go down, -1 to go up
+
+    def __call__(self, entity: tcod.ecs.Entity) -> ActionResult:
+        map_ = entity.relation_tag[InMap]
+        if self.dz > 0:
+            stairs, direction, verb = TileIndices.DOWN_STAIRS, "down", "descend"
+        else:
+            stairs, direction, verb = TileIndices.UP_STAIRS, "up", "climb"
+        if map_.components[Tiles][entity.components[Position].raw] != stairs:
+            return Failure(f"There are no stairs {direction} here.")
+        depth = map_.components[Depth] + self.dz
+        change_level(entity, depth)
+        add_message(entity.registry, f"You {verb} to depth {depth}.")
+        return Success()
+
+
 def escape_action(entity: tcod.ecs.Entity) -> ActionResult:
     raise SystemExit()
     return Success()
 
 def regenenerate_map(entity: tcod.ecs.Entity) -> ActionResult: # TODO: remove when not in testing builds
-    r = entity.registry
-    new_seed = int(time.time())
-    print(f"Seed: {new_seed}")
-    r[None].components["Random"].seed(new_seed)
-    map(lambda e : e.clear(), r.Q.all_of(relations=[(InMap, ...)]).none_of(tags=[IsPlayer]))
-    r[None].relation_tag[ActiveMap].clear()
-    map_ = generate_caves(
-        r,
-        MAP_WIDTH,
-        MAP_HEIGHT,
-        ROOM_MAX_SIZE,
-        ROOM_MIN_SIZE,
-        MAX_ROOMS,
-    )
-    r[None].relation_tag[ActiveMap] = map_
-    update_fov(entity)
+    reroll_dungeon(entity)
     return Failure("DEBUG ACTION: regenerate map")
 
 def reveal_map(entity: tcod.ecs.Entity) -> ActionResult:
@@ -204,4 +243,4 @@ def wait_action(entity: tcod.ecs.Entity) -> ActionResult:
     # do nothing for one turn
     return Success()
 
-from dungeon.procgen import generate_caves
+from engine.level_helpers import change_level, reroll_dungeon
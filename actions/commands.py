@@ -0,0 +1,63 @@
+"""Multi-turn player commands: auto-explore, travel and rest.
+
+A command is a generator of the actions the player takes, one per turn, which
+`actions.action_helpers.do_player_command` runs until it is exhausted or
+interrupted. Each path is planned from a single distance map and then walked
+step by step, so a long trip costs one Dijkstra pass rather than one per turn.
+Steps are kept as offsets, so a path stays valid when a chunked map scrolls
+under the player.
+"""
+from __future__ import annotations
+
+from typing import Iterator
+
+import tcod.ecs
+
+from actions.action import Action
+from actions.actions import Move, wait_action
+from components.main import Position, ExploredTiles, HP, HPMax
+from constants.tags import InMap
+from dungeon.tiles import TILES, TileIndices
+from engine.messaging import add_message
+from engine.path_tools import explore_map, travel_map, downhill_steps
+
+
+def explore(player: tcod.ecs.Entity) -> Iterator[Action]:
+    """Walk to the nearest tile never seen, over and over, until nothing unexplored can be reached.
+
+    Each leg is planned once and walked until it ends or runs into a tile
+    revealed to be a wall on the way, then the next leg is planned."""
+    while True:
+        map_ = player.relation_tag[InMap]
+        steps = downhill_steps(player.components[Position], explore_map(map_))
+        if not steps:
+            add_message(player.registry, "There is nothing left to explore.", stack=False)
+            return
+        for step in steps:
+            # the map may have scrolled since the last step, so look the next tile up afresh
+            map_ = player.relation_tag[InMap]
+            seen = map_.components[ExploredTiles][(player.components[Position] + step).raw]
+            if seen != TileIndices.VOID and not TILES["walk_cost"][seen]:
+                break
+            yield Move(*step)
+
+def travel(player: tcod.ecs.Entity, dest: Position) -> Iterator[Action]:
+    """Walk to `dest` over explored tiles."""
+    map_ = player.relation_tag[InMap]
+    if not TILES["walk_cost"][map_.components[ExploredTiles][dest.raw]]:
+        add_message(player.registry, "You don't know a way there.", "GREY", stack=False)
+        return
+    steps = downhill_steps(player.components[Position], travel_map(map_, dest))
+    if not steps and player.components[Position] != dest:
+        add_message(player.registry, "You don't know a way there.", "GREY", stack=False)
+    for step in steps:
+        yield Move(*step)
+
+def rest(player: tcod.ecs.Entity) -> Iterator[Action]:
+    """Wait until the player's hitpoints are full."""
+    if player.components[HP] >= player.components[HPMax]:
+        add_message(player.registry, "You are already at full health.", "GREY", stack=False)
+        return
+    while player.components[HP] < player.components[HPMax]:
+        yield wait_action
+    add_message(player.registry, "You feel rested.")
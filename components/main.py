@@ -1,6 +1,7 @@
 from __future__ import annotations
 
-from typing import Final
+from concurrent.futures import Future
+from typing import Any, Final
 
 import attrs
 import numpy as np
@@ -10,6 +11,8 @@ import tcod.ecs
 import tcod.ecs.callbacks
 
 from actions.action import Action
+from constants.tags import IsActor, IsBlocking, IsItem, InMap
+from dungeon.tiles import TILES
 
 
 @attrs.define(frozen=True)
@@ -50,6 +53,40 @@ class MapShape:
     def raw(self) -> tuple[int, int]:
         return (self.width, self.height)
 
+class SpatialIndex:
+    """Which actors and items are at each position of a map.
+
+    An entity is indexed by its tags at the time it enters the map, so code
+    that removes IsActor or IsItem from an entity in a map must `discard` it first."""
+    def __init__(self, shape: MapShape) -> None:
+        self.blocking: NDArray[np.bool] = np.zeros(shape.raw, dtype=np.bool)
+        """True where a blocking actor stands."""
+        self.actors: dict[tuple[int, int], tcod.ecs.Entity] = {}
+        self.items: dict[tuple[int, int], list[tcod.ecs.Entity]] = {}
+        self.others: dict[tuple[int, int], list[tcod.ecs.Entity]] = {}
+        """Everything else in the map, such as remains."""
+
+    def add(self, e: tcod.ecs.Entity, pos: Position) -> None:
+        if IsActor in e.tags:
+            self.actors[pos.raw] = e
+            if IsBlocking in e.tags:
+                self.blocking[pos.raw] = True
+        elif IsItem in e.tags:
+            self.items.setdefault(pos.raw, []).append(e)
+        else:
+            self.others.setdefault(pos.raw, []).append(e)
+
+    def discard(self, e: tcod.ecs.Entity, pos: Position) -> None:
+        if self.actors.get(pos.raw) is e:
+            del self.actors[pos.raw]
+            self.blocking[pos.raw] = False
+        for stacks in (self.items, self.others):
+            stack = stacks.get(pos.raw)
+            if stack and e in stack:
+                stack.remove(e)
+                if not stack:
+                    del stacks[pos.raw]
+
 Name: Final = ("Name", str)
 """An entity's name."""
 HP: Final = ("HP", int)
@@ -64,6 +101,8 @@ Defense: Final = ("Defense", int)
 """An entity's armor value."""
 AI: Final = ("AI", Action)
 """An actor's AI action."""
+AlertedTo: Final = ("AlertedTo", Position)
+"""Where an awake actor last noticed the player or a noise."""
 
 Tiles: Final = ("Tiles", NDArray[np.int8])
 """A map's tile composition."""
@@ -71,6 +110,151 @@ VisibleTiles: Final = ("VisibleTiles", NDArray[np.bool])
 """A player's currently visible tiles."""
 ExploredTiles: Final = ("ExploredTiles", NDArray[np.int8])
 """A map's tiles that have already been seen."""
+FovWindow: Final = ("FovWindow", tuple[slice, slice])
+"""The part of a map's `VisibleTiles` the last FOV update could have set. Dropped when `VisibleTiles` is replaced."""
+WalkCost: Final = ("WalkCost", NDArray[np.int8])
+"""A map's walk cost per tile, derived from its Tiles. Do not write to it directly."""
+Transparency: Final = ("Transparency", NDArray[np.bool])
+"""A map's transparency per tile, derived from its Tiles. Do not write to it directly."""
+ChaseMap: Final = ("ChaseMap", NDArray[np.int32])
+"""A map's distances to the player, shared by every chasing actor for the current turn."""
+Depth: Final = ("Depth", int)
+"""How deep a map is in the dungeon, starting at 1."""
+Levels: Final = ("Levels", dict[int, bytes])
+"""Compressed snapshots of the levels the player is not on, by depth. Lives on the world's global entity."""
+ChunkOrigin: Final = ("ChunkOrigin", tuple[int, int])
+"""The chunk coordinates of a chunked map's top left chunk in play. Map positions are relative to it."""
+ChunkSeed: Final = ("ChunkSeed", int)
+"""The seed a chunked map's chunks are generated from."""
+ChunkStorage: Final = ("ChunkStorage", Any)
+"""The `dungeon.chunks.ChunkStore` holding a chunked map's chunks that are out of play."""
+DungeonSeed: Final = ("DungeonSeed", int)
+"""Seed every level below the first is generated from, drawn when the world is created. Lives on the world's global entity."""
+TurnCount: Final = ("TurnCount", int)
+"""How many turns the player has taken. Lives on the world's global entity."""
+PendingLevels: Final = ("PendingLevels", dict[int, Future[Any]])
+"""Levels being generated in the background, by depth. Lives on the world's global entity and is never saved."""
+MapGraphics: Final = ("MapGraphics", tuple[tuple[int, int], NDArray[Any]])
+"""A map's rendered tile layer for the viewport at the given origin, cached until its tiles or visibility change."""
+EntityGlyphs: Final = ("EntityGlyphs", tuple[tuple[int, int], list[tuple[int, int, Graphic]]])
+"""A map's visible entities in the viewport at the given origin, in screen coordinates.
+Cached until something in the map moves or changes looks."""
+
+# the stats an ActorTable mirrors, by the column they go in
+STAT_COLUMNS: Final = {HP: "hp", HPMax: "hp_max", PowerMin: "power_min", PowerMax: "power_max", Defense: "defense"}
+ACTOR_COLUMNS: Final = ("x", "y", *STAT_COLUMNS.values())
+
+
+class ActorTable:
+    """A map's actors as rows of NumPy columns, for work over the whole population at once.
+
+    Each actor's Position and combat stats are mirrored into the `ACTOR_COLUMNS`,
+    kept up to date by the component callbacks and by `enter_map` and `leave_map`.
+    The components stay authoritative: writing to a column does not change them.
+    Stats are read when an actor is added, and only changes to stats it already
+    had are mirrored after that.
+    Like `SpatialIndex`, code that removes IsActor from an entity in a map must
+    `discard` it first.
+
+    tcod-ecs cannot keep a component in an external array, so the table is a
+    mirror: it costs memory on top of the components and does not speed up
+    reading one actor's stats. Its one reader is `engine.replay_helpers.world_checksum`,
+    which hashes every actor's position and hitpoints per recorded event.
+    Lookups around one position belong to `SpatialIndex`, which only touches
+    the cells asked about."""
+    def __init__(self, capacity: int = 16) -> None:
+        self.entities: list[tcod.ecs.Entity] = []
+        """The actor in each row."""
+        self.rows: dict[tcod.ecs.Entity, int] = {}
+        self._columns: dict[str, NDArray[np.int32]] = {name: np.zeros(capacity, dtype=np.int32) for name in ACTOR_COLUMNS}
+
+    def __len__(self) -> int:
+        return len(self.entities)
+
+    def column(self, name: str) -> NDArray[np.int32]:
+        """Return a view of a column's rows in use."""
+        return self._columns[name][: len(self.entities)]
+
+    def add(self, e: tcod.ecs.Entity) -> None:
+        if e in self.rows:
+            return
+        row = len(self.entities)
+        if row == len(self._columns["x"]):
+            for name, column in self._columns.items():
+                self._columns[name] = np.concatenate([column, np.zeros_like(column)])
+        self.entities.append(e)
+        self.rows[e] = row
+        self._columns["x"][row], self._columns["y"][row] = e.components[Position].raw
+        for key, name in STAT_COLUMNS.items():
+            self._columns[name][row] = e.components.get(key, 0)
+
+    def discard(self, e: tcod.ecs.Entity) -> None:
+        row = self.rows.pop(e, None)
+        if row is None:
+            return
+        # fill the hole with the last row
+        last = self.entities.pop()
+        if last is not e:
+            self.entities[row] = last
+            self.rows[last] = row
+            for column in self._columns.values():
+                column[row] = column[len(self.entities)]
+
+    def set(self, e: tcod.ecs.Entity, name: str, value: int) -> None:
+        row = self.rows.get(e, None)
+        if row is not None:
+            self._columns[name][row] = value
+
+ActorStats: Final = ("ActorStats", ActorTable)
+"""A map's actors as NumPy columns, built on first use by `engine.actor_helpers.actor_table`."""
+
+def actor_table_of(e: tcod.ecs.Entity) -> ActorTable | None:
+    """Return the actor table of the map `e` is in, if it has been built."""
+    map_ = e.relation_tag.get(InMap, None)
+    if map_ is None:
+        return None
+    table: ActorTable | None = map_.components.get(ActorStats, None)
+    return table
+
+def invalidate_entity_layer(e: tcod.ecs.Entity) -> None:
+    """Drop the cached entity layer of the map `e` is in, if any."""
+    map_ = e.relation_tag.get(InMap, None)
+    if map_ is not None:
+        map_.components.pop(EntityGlyphs, None)
+
+def enter_map(e: tcod.ecs.Entity, map_: tcod.ecs.Entity) -> None:
+    """Put an entity with a Position into a map. Use this instead of setting InMap directly."""
+    leave_map(e)
+    e.relation_tag[InMap] = map_
+    invalidate_entity_layer(e)
+    if SpatialIndex in map_.components:
+        map_.components[SpatialIndex].add(e, e.components[Position])
+    if ActorStats in map_.components and IsActor in e.tags:
+        map_.components[ActorStats].add(e)
+
+def enter_map_many(entities: list[tcod.ecs.Entity], map_: tcod.ecs.Entity) -> None:
+    """Put entities that are in no map yet into `map_`, like `enter_map` but in one pass."""
+    index: SpatialIndex | None = map_.components.get(SpatialIndex, None)
+    table: ActorTable | None = map_.components.get(ActorStats, None)
+    map_.components.pop(EntityGlyphs, None)
+    for e in entities:
+        e.relation_tag[InMap] = map_
+        if index is not None:
+            index.add(e, e.components[Position])
+        if table is not None and IsActor in e.tags:
+            table.add(e)
+
+def leave_map(e: tcod.ecs.Entity) -> None:
+    """Take an entity out of whichever map it is in. Use this instead of deleting InMap directly."""
+    map_ = e.relation_tag.get(InMap, None)
+    if map_ is None:
+        return
+    invalidate_entity_layer(e)
+    if SpatialIndex in map_.components and Position in e.components:
+        map_.components[SpatialIndex].discard(e, e.components[Position])
+    if ActorStats in map_.components:
+        map_.components[ActorStats].discard(e)
+    del e.relation_tag[InMap]
 
 @tcod.ecs.callbacks.register_component_changed(component=Position)
 def on_position_changed(e: tcod.ecs.Entity, old: Position | None, new: Position | None) -> None:
@@ -80,3 +264,55 @@ def on_position_changed(e: tcod.ecs.Entity, old: Position | None, new: Position
         e.tags.remove(old)
     if new is not None:
         e.tags.add(new)
+    map_ = e.relation_tag.get(InMap, None)
+    if map_ is None:
+        return
+    map_.components.pop(EntityGlyphs, None)
+    if new is not None and ActorStats in map_.components:
+        map_.components[ActorStats].set(e, "x", new.x)
+        map_.components[ActorStats].set(e, "y", new.y)
+    if SpatialIndex not in map_.components:
+        return
+    index: SpatialIndex = map_.components[SpatialIndex]
+    if old is not None:
+        index.discard(e, old)
+    if new is not None:
+        index.add(e, new)
+
+@tcod.ecs.callbacks.register_component_changed(component=Tiles)
+def on_tiles_changed(e: tcod.ecs.Entity, old: NDArray[np.int8] | None, new: NDArray[np.int8] | None) -> None:
+    """Rebuild the layers derived from a map's tiles whenever they are replaced."""
+    e.components.pop(MapGraphics, None)
+    if new is None:
+        e.components.pop(WalkCost, None)
+        e.components.pop(Transparency, None)
+        return
+    e.components[WalkCost] = TILES["walk_cost"][new]
+    e.components[Transparency] = TILES["transparent"][new]
+
+def _mirror_stat(name: str) -> Any:
+    def on_stat_changed(e: tcod.ecs.Entity, old: int | None, new: int | None) -> None:
+        if old is None:
+            # stats are given to actors as they are created, before they are in any map
+            return
+        table = actor_table_of(e)
+        if table is not None:
+            table.set(e, name, 0 if new is None else new)
+    return on_stat_changed
+
+for _key, _name in STAT_COLUMNS.items():
+    tcod.ecs.callbacks.register_component_changed(component=_key)(_mirror_stat(_name))
+
+@tcod.ecs.callbacks.register_component_changed(component=Graphic)
+def on_graphic_changed(e: tcod.ecs.Entity, old: Graphic | None, new: Graphic | None) -> None:
+    invalidate_entity_layer(e)
+
+@tcod.ecs.callbacks.register_component_changed(component=VisibleTiles)
+def on_visible_changed(e: tcod.ecs.Entity, old: NDArray[np.bool] | None, new: NDArray[np.bool] | None) -> None:
+    e.components.pop(FovWindow, None)
+    e.components.pop(MapGraphics, None)
+    e.components.pop(EntityGlyphs, None)
+
+@tcod.ecs.callbacks.register_component_changed(component=ExploredTiles)
+def on_explored_changed(e: tcod.ecs.Entity, old: NDArray[np.int8] | None, new: NDArray[np.int8] | None) -> None:
+    e.components.pop(MapGraphics, None)
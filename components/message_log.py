@@ -1,10 +1,13 @@
 from __future__ import annotations
 
-from typing import Final
+from collections import deque
+from typing import Iterable
 
 import attrs
+import tcod.console
 
 import constants.colors as colors
+from constants.gui_constants import MESSAGE_LOG_CAPACITY
 
 
 
@@ -15,6 +18,7 @@ class Message:
     text: str
     fg_color: str
     count: int = 1
+    _heights: dict[tuple[int, int], int] = attrs.field(factory=dict, init=False, repr=False, eq=False)
 
 
     @property
@@ -30,4 +34,33 @@ class Message:
             return f"{self.text} (x{self.count})"
         return self.text
 
-MessageLog: Final = list[Message]
+    def height(self, width: int) -> int:
+        """How many lines this message takes up when wrapped to `width`.
+
+        Cached per width and stack count, so the text is only re-wrapped when it changes."""
+        key = (width, self.count)
+        if key not in self._heights:
+            self._heights[key] = tcod.console.get_height_rect(width, self.full_text)
+        return self._heights[key]
+
+class MessageLog(deque[Message]):
+    """The message log, keeping only the most recent `capacity` messages."""
+
+    def __init__(self, messages: Iterable[Message] = (), capacity: int = MESSAGE_LOG_CAPACITY) -> None:
+        super().__init__(messages, capacity)
+        self.version = 0
+        """Bumped on every change, so renderers can tell when the log needs redrawing."""
+        self.rendered: tuple[tuple[int, int, int], tcod.console.Console] | None = None
+        """The last rendering of the log, keyed by (version, width, height)."""
+
+    def add(self, text: str, fg_color: str, stack: bool = True) -> None:
+        """Append a message, stacking it onto the last one if they are the same.
+
+        Without `stack`, a message the same as the last one is dropped instead."""
+        if self and self[-1].text == text and self[-1].fg_color == fg_color:
+            if not stack:
+                return
+            self[-1].count += 1
+        else:
+            self.append(Message(text, fg_color))
+        self.version += 1
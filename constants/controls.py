@@ -27,4 +27,12 @@ WAIT_KEYS: Final = [
     tcod.event.KeySym.KP_5,
 ]
 
+EXPLORE_KEYS: Final = [
+    tcod.event.KeySym.o,
+]
+
+REST_KEYS: Final = [
+    tcod.event.KeySym.r,
+]
+
 SELECT_KEYS: Final = "abcdefghijklmnopqrstuvwxyz"
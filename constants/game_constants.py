@@ -15,9 +15,17 @@ WINDOW_TITLE = "Yet Another Roguelike Tutorial"
 WINDOW_VSYNC = True
 SCREEN_W = 80
 SCREEN_H = 50
+SAVE_PATH = "savegame.dat"
+RECORDING_PATH = "session.rec" # every key press and click of the current game, replayable with tools.replay
+CHUNK_STORE_PATH = f"{SAVE_PATH}.chunks" # chunks of the overworld that are out of play, kept with the save
+TIMING_CSV_PATH: str | None = None # when set, per-frame phase timings are streamed to this file
 
 # player tuning - player stats that can not change go here
 PLAYER_FOV_RADIUS = 10
+PLAYER_REGEN_TURNS = 10 # the player heals one hitpoint every this many turns
+COMMAND_TURN_LIMIT = 1000 # turns an explore, travel or rest command may take before it stops
 
 # behaviour tuning - things like how enemies will path
 PATH_COST_INCREASE = 15
+ENEMY_WAKE_RADIUS = PLAYER_FOV_RADIUS + 2 # enemies this close to the player wake up and get a full AI turn
+MELEE_NOISE_RADIUS = 6 # enemies this close to a fight wake up
@@ -1,6 +1,15 @@
+from constants.game_constants import SCREEN_W, SCREEN_H
+
+VIEWPORT_WIDTH = SCREEN_W
+VIEWPORT_HEIGHT = SCREEN_H - 5 # the bottom rows hold the HUD
+
 HEALTH_BAR_WIDTH = 15
 MESSAGE_LOG_WIDTH = 40
 MESSAGE_LOG_HEIGHT = 5
+MESSAGE_LOG_CAPACITY = 200 # older messages are dropped
+
+TIMING_WINDOW = 120 # frames averaged by the timing overlay
+TIMING_OVERLAY_WIDTH = 34
 
 ITEM_SELECT_FRAME_WIDTH = 50
 ITEM_SELECT_FRAME_HEIGHT = 20
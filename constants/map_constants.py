@@ -1,16 +1,25 @@
-from constants.game_constants import SCREEN_W, SCREEN_H
-
 # general mapgen rules
 ROOM_MAX_SIZE = 10
 ROOM_MIN_SIZE = 8
 MAX_ROOMS = 200
 MAX_MONSTERS_PER_ROOM = 2
 MAX_ITEMS_PER_ROOM = 2
-MAP_WIDTH = SCREEN_W
-MAP_HEIGHT = SCREEN_H - 5
+MAP_WIDTH = 80 # maps may be larger than the viewport, the camera follows the player
+MAP_HEIGHT = 45
+
+# chunked maps, which are generated as the player explores them
+CHUNK_SIZE = 32
+CHUNK_WINDOW = 5 # chunks per side kept in play around the player's chunk; must be odd
+CHUNK_FLOOR_CHANCE = 0.66 # chance for a cell to start as floor before CA; much lower and chunks break up into pockets
+CHUNK_MAX_MONSTERS = 3
+CHUNK_STORE_LIMIT = 4096 # chunks kept on disk, about 8 MiB; older ones are forgotten and generated afresh
 
 # rules for caves
 CA_FIRST_PASSES = 5 # number of times to apply first-wave CA rules
 CA_SECOND_PASSES = 3 # number of times to apply second wave CA rules
 CA_MIN_WALLS = 5 # number of walls needed for a floor to become a wall
 CA_MIN_FLOORS = 6 # number of floors needed for a wall in the second wave to become a floor
+TUNNEL_WALL_COST = 4 # cost of digging through a wall when connecting caves, against 1 for walking through open floor
+TUNNEL_WALL_NOISE = 8 # random extra cost per wall tile, which makes tunnels wander
+TUNNEL_ENDPOINTS = 16 # floor cells sampled from each cave as candidate tunnel ends
+TUNNEL_MARGIN = 8 # cells around the two caves' bounding boxes a tunnel between them may wander through
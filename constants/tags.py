@@ -10,6 +10,9 @@ IsBlocking: Final = "IsBlocking" # an entity that blocks movement
 IsItem: Final = "IsItem"
 IsQuaffable: Final = "IsQuaffable" # potions, draughts, cola, etc
 
+# AI state tags
+IsAwake: Final = "IsAwake" # actors without this tag are dormant and skip their turns
+
 
 # Association/relational tags
 ActiveMap: Final = "ActiveMap"
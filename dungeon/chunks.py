@@ -0,0 +1,156 @@
+"""Chunked storage for maps too big to keep in memory.
+
+A chunked map is divided into CHUNK_SIZE square chunks addressed by chunk
+coordinates, which may be negative. A chunk's tiles are generated the first
+time it is needed, from the map seed and its coordinates alone: every cell's
+initial noise is a hash of its world position, and the cave CA is run over
+the chunk plus a margin as wide as the number of CA passes, so neighbouring
+chunks meet seamlessly whichever is generated first.
+
+Chunks that are not in play live in a `ChunkStore` directory: tiles and
+explored tiles as one `.npy` file per chunk, read back memory-mapped, and the
+entities that were in the chunk as a compressed pickle. The store keeps at
+most CHUNK_STORE_LIMIT chunks, forgetting the least recently used ones, which
+are generated afresh if the player ever returns to them.
+"""
+from __future__ import annotations
+
+import os
+import pickle
+import shutil
+import tempfile
+import weakref
+import zlib
+from random import Random
+from typing import Any
+
+import numpy as np
+from numpy.typing import NDArray
+
+from mobs.mob_prefabs import MobPrefab, MONSTER_SPAWNS
+from constants.map_constants import (
+    CHUNK_SIZE,
+    CHUNK_FLOOR_CHANCE,
+    CHUNK_MAX_MONSTERS,
+    CHUNK_STORE_LIMIT,
+    CA_FIRST_PASSES,
+    CA_SECOND_PASSES,
+)
+from dungeon.map_helpers import sample_prefabs
+from dungeon.procgen import cave_first_ca, cave_second_ca
+from dungeon.tiles import TileIndices
+
+
+# the CA reaches one cell further per pass, so a margin this wide makes chunk borders seamless
+CHUNK_MARGIN = CA_FIRST_PASSES + CA_SECOND_PASSES
+
+# marks a directory as a chunk store, so only stores are ever emptied
+STORE_MARKER = ".chunkstore"
+
+EntitySnapshot = tuple[dict[Any, Any], set[Any]]
+
+
+def cell_noise(seed: int, xs: NDArray[np.int64], ys: NDArray[np.int64]) -> NDArray[np.float64]:
+    """Return a uniform value in [0, 1) for every world position, depending only on `seed` and the position."""
+    h = xs.astype(np.int64).view(np.uint64) * np.uint64(0x9E3779B97F4A7C15)
+    h ^= ys.astype(np.int64).view(np.uint64) * np.uint64(0xC2B2AE3D27D4EB4F)
+    h ^= np.uint64(seed & 0xFFFFFFFFFFFFFFFF)
+    # splitmix64 finaliser
+    h ^= h >> np.uint64(30)
+    h *= np.uint64(0xBF58476D1CE4E5B9)
+    h ^= h >> np.uint64(27)
+    h *= np.uint64(0x94D049BB133111EB)
+    h ^= h >> np.uint64(31)
+    return (h >> np.uint64(11)).astype(np.float64) / float(1 << 53)
+
+def generate_chunk(seed: int, cx: int, cy: int) -> tuple[NDArray[np.int8], list[tuple[tuple[int, int], MobPrefab]]]:
+    """Return the tiles of chunk (cx, cy), and monster spawns in world coordinates."""
+    x0, y0 = cx * CHUNK_SIZE, cy * CHUNK_SIZE
+    xs, ys = np.meshgrid(
+        np.arange(x0 - CHUNK_MARGIN, x0 + CHUNK_SIZE + CHUNK_MARGIN),
+        np.arange(y0 - CHUNK_MARGIN, y0 + CHUNK_SIZE + CHUNK_MARGIN),
+        indexing="ij",
+    )
+    tiles = np.where(cell_noise(seed, xs, ys) < CHUNK_FLOOR_CHANCE, TileIndices.FLOOR, TileIndices.WALL).astype(np.int8)
+    for i in range(CA_FIRST_PASSES):
+        tiles = cave_first_ca(tiles)
+    for i in range(CA_SECOND_PASSES):
+        tiles = cave_second_ca(tiles)
+    tiles = np.ascontiguousarray(tiles[CHUNK_MARGIN:-CHUNK_MARGIN, CHUNK_MARGIN:-CHUNK_MARGIN])
+
+    rng = Random(f"{seed}/{cx}/{cy}")
+    floors = np.argwhere(tiles == TileIndices.FLOOR)
+    count = min(rng.randint(0, CHUNK_MAX_MONSTERS), len(floors))
+    positions = floors[rng.sample(range(len(floors)), count)] + (x0, y0)
+    spawns = list(zip(map(tuple, positions.tolist()), sample_prefabs(rng, MONSTER_SPAWNS, count)))
+    return tiles, spawns
+
+
+class ChunkStore:
+    """A directory holding the chunks of one chunked map that are not in play.
+
+    Without a path, the store lives in a temporary directory removed along with
+    the store. A path is emptied if it already holds a chunk store, and refused
+    if it holds anything else."""
+    def __init__(self, path: str | None = None, limit: int = CHUNK_STORE_LIMIT) -> None:
+        if path is None:
+            path = tempfile.mkdtemp(prefix="chunks-")
+            weakref.finalize(self, shutil.rmtree, path, True)
+        elif os.path.exists(path):
+            if not os.path.exists(os.path.join(path, STORE_MARKER)):
+                raise FileExistsError(f"{path} exists and is not a chunk store.")
+            shutil.rmtree(path)
+        os.makedirs(path, exist_ok=True)
+        open(os.path.join(path, STORE_MARKER), "wb").close()
+        self.path = path
+        self.limit = limit
+        self.chunks: dict[tuple[int, int], None] = {}
+        """The chunks in the store, least recently used first."""
+
+    def _file(self, chunk: tuple[int, int], suffix: str) -> str:
+        return os.path.join(self.path, f"{chunk[0]}_{chunk[1]}.{suffix}")
+
+    def _touch(self, chunk: tuple[int, int]) -> None:
+        self.chunks.pop(chunk, None)
+        self.chunks[chunk] = None
+
+    def has_tiles(self, chunk: tuple[int, int]) -> bool:
+        return chunk in self.chunks
+
+    def load_tiles(self, chunk: tuple[int, int]) -> NDArray[np.int8]:
+        """Return a memory-mapped (2, CHUNK_SIZE, CHUNK_SIZE) array of the chunk's tiles and explored tiles."""
+        self._touch(chunk)
+        layers: NDArray[np.int8] = np.load(self._file(chunk, "npy"), mmap_mode="r")
+        return layers
+
+    def save_tiles(self, chunk: tuple[int, int], tiles: NDArray[np.int8], explored: NDArray[np.int8]) -> None:
+        np.save(self._file(chunk, "npy"), np.stack([tiles, explored]))
+        self._touch(chunk)
+        while len(self.chunks) > self.limit:
+            self.forget(next(iter(self.chunks)))
+
+    def forget(self, chunk: tuple[int, int]) -> None:
+        """Drop a chunk and its entities, so it is generated afresh when next needed."""
+        del self.chunks[chunk]
+        for suffix in ("npy", "entities"):
+            if os.path.exists(self._file(chunk, suffix)):
+                os.remove(self._file(chunk, suffix))
+
+    def take_entities(self, chunk: tuple[int, int]) -> list[EntitySnapshot]:
+        """Return and forget the entities stored for a chunk."""
+        path = self._file(chunk, "entities")
+        if not os.path.exists(path):
+            return []
+        with open(path, "rb") as f:
+            snapshots: list[EntitySnapshot] = pickle.loads(zlib.decompress(f.read()))
+        os.remove(path)
+        return snapshots
+
+    def save_entities(self, chunk: tuple[int, int], snapshots: list[EntitySnapshot]) -> None:
+        with open(self._file(chunk, "entities"), "wb") as f:
+            f.write(zlib.compress(pickle.dumps(snapshots, protocol=5), 1))
+
+    def delete(self) -> None:
+        """Remove the store's directory and everything in it."""
+        shutil.rmtree(self.path, ignore_errors=True)
+        self.chunks.clear()
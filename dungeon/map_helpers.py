@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from typing import Iterator, TYPE_CHECKING
+from typing import Any, Sequence, TypeVar
 from random import Random
 
 import numpy as np
@@ -8,18 +8,15 @@ from numpy.typing import NDArray
 
 import tcod
 import tcod.ecs
-import tcod.ecs.entity
-import tcod.ecs.registry
 
 import mobs.mob_prefabs as mob_prefabs
 import items.item_prefabs as item_prefabs
-from components.main import Position, Tiles, AI
+from components.main import Tiles, WalkCost, Transparency, MapGraphics
 from constants.map_constants import MAX_MONSTERS_PER_ROOM, MAX_ITEMS_PER_ROOM
-from constants.tags import InMap, IsActor
-from dungeon.tiles import TileIndices
-from engine.actor_helpers import create_actor
-from engine.item_helpers import create_item
-from actions.actions import SimpleEnemy
+from dungeon.tiles import TILES, TileIndices
+
+
+T = TypeVar("T")
 
 class RectangularRoom:
     """A rectangular room."""
@@ -51,13 +48,27 @@ class RectangularRoom:
         )
 
 
+class RoomGrid:
+    """The cells of a map covered by rooms, for overlap tests that do not depend on the number of rooms.
+
+    A room covers its closed rectangle x1..x2, y1..y2, matching `RectangularRoom.intersects`."""
+    def __init__(self, width: int, height: int) -> None:
+        self.occupied: NDArray[np.bool] = np.zeros((width, height), dtype=np.bool)
+
+    def add(self, room: RectangularRoom) -> None:
+        self.occupied[room.x1 : room.x2 + 1, room.y1 : room.y2 + 1] = True
+
+    def is_free(self, room: RectangularRoom) -> bool:
+        """Return True if `room` overlaps none of the rooms added so far."""
+        return not self.occupied[room.x1 : room.x2 + 1, room.y1 : room.y2 + 1].any()
+
+
 def tunnel_between(
-        world: tcod.ecs.Registry,
+        rng: Random,
         start: tuple[int, int],
         end: tuple[int, int],
-) -> Iterator[tuple[int, int]]:
-    """Return an L-shaped tunnel between these two points."""
-    rng: Random = world[None].components["Random"]
+) -> NDArray[np.intc]:
+    """Return the cells of an L-shaped tunnel between these two points, as a (length, 2) array."""
     x1, y1 = start
     x2, y2 = end
     if rng.random()  < 0.5:
@@ -66,38 +77,57 @@ def tunnel_between(
         corner_x, corner_y = x1, y2
 
     # Generate the coordinates for this tunnel
-    for x, y in tcod.los.bresenham((x1, y1), (corner_x, corner_y)).tolist():
-        yield x, y
-    for x, y in tcod.los.bresenham((corner_x, corner_y), (x2, y2)).tolist():
-        yield x, y
-
-
-def place_monsters_in_rooms(map_: tcod.ecs.Entity, rooms: list[RectangularRoom], world: tcod.ecs.Registry) -> None:
-    rng: Random = world[None].components["Random"]
-    map_tiles: NDArray[np.int8] = map_.components[Tiles]
+    return np.concatenate([
+        tcod.los.bresenham((x1, y1), (corner_x, corner_y)),
+        tcod.los.bresenham((corner_x, corner_y), (x2, y2)),
+    ])
+
+
+def set_tiles(map_: tcod.ecs.Entity, where: Any, tile: TileIndices) -> None:
+    """Change some of a map's tiles in place, patching the derived tile layers to match.
+
+    `where` is any NumPy index into the map: a position tuple, slices or a mask.
+    Use this instead of writing to `Tiles` directly once a map is in play."""
+    map_.components[Tiles][where] = tile
+    map_.components[WalkCost][where] = TILES["walk_cost"][tile]
+    map_.components[Transparency][where] = TILES["transparent"][tile]
+    map_.components.pop(MapGraphics, None)
+
+
+def sample_prefabs(rng: Random, spawns: Sequence[tuple[T, int]], count: int) -> list[T]:
+    """Draw `count` prefabs from a table of (prefab, weight) pairs, in one go."""
+    prefabs, weights = zip(*spawns)
+    return rng.choices(prefabs, weights, k=count)
+
+def plan_monsters_in_rooms(
+        rng: Random,
+        map_tiles: NDArray[np.int8],
+        rooms: list[RectangularRoom],
+        occupied: set[tuple[int, int]],
+        max_monsters: int = MAX_MONSTERS_PER_ROOM,
+) -> list[tuple[tuple[int, int], mob_prefabs.MobPrefab]]:
+    """Pick monster spawns for every room but the first. Spawned positions are added to `occupied`."""
+    positions: list[tuple[int, int]] = []
     for i in range(len(rooms)):
         if i == 0:
             # no monsters in the antechamber
             continue
-        for j in range(MAX_MONSTERS_PER_ROOM):
-            entities = world.Q.all_of(tags=[IsActor], relations=[(InMap, map_)])
+        for j in range(max_monsters):
             x, y = rng.randint(rooms[i].x1 + 1, rooms[i].x2), rng.randint(rooms[i].y1 + 1, rooms[i].y2)
             if ((not map_tiles[x, y] == TileIndices.WALL) and
-                (not any(e.components[Position].raw == (x, y) for e in entities))):
-                new_actor: tcod.ecs.Entity
-                prefab: mob_prefabs.MobPrefab
-                if rng.random() < 0.8:
-                    prefab = mob_prefabs.orc
-                else:
-                    prefab = mob_prefabs.troll
-                new_actor = create_actor((x, y), prefab, world)
-                new_actor.components[AI] = SimpleEnemy()
-                new_actor.relation_tag[InMap] = map_
-
-
-def place_items_in_rooms(map_: tcod.ecs.Entity, rooms: list[RectangularRoom], world: tcod.ecs.Registry):
-    rng: Random = world[None].components["Random"]
-    map_tiles: NDArray[np.int8] = map_.components[Tiles]
+                (not (x, y) in occupied)):
+                positions.append((x, y))
+                occupied.add((x, y))
+    return list(zip(positions, sample_prefabs(rng, mob_prefabs.MONSTER_SPAWNS, len(positions))))
+
+
+def plan_items_in_rooms(
+        rng: Random,
+        map_tiles: NDArray[np.int8],
+        rooms: list[RectangularRoom],
+) -> list[tuple[tuple[int, int], item_prefabs.ItemPrefab]]:
+    """Pick item spawns for every room but the first."""
+    positions: list[tuple[int, int]] = []
     for i in range(len(rooms)):
         if i == 0:
             # no items in antechamber
@@ -107,6 +137,5 @@ def place_items_in_rooms(map_: tcod.ecs.Entity, rooms: list[RectangularRoom], wo
                 continue
             x, y = rng.randint(rooms[i].x1 + 1, rooms[i].x2), rng.randint(rooms[i].y1 + 1, rooms[i].y2)
             if (not map_tiles[x, y] == TileIndices.WALL):
-                prefab = item_prefabs.health_potion
-                new_item = create_item((x, y), prefab, world)
-                new_item.relation_tag[InMap] = map_
+                positions.append((x, y))
+    return list(zip(positions, sample_prefabs(rng, item_prefabs.ITEM_SPAWNS, len(positions))))
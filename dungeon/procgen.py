@@ -1,110 +1,122 @@
 from __future__ import annotations
 
-from itertools import pairwise
-from typing import List
+from types import ModuleType
+from typing import Final, List
 
+import attrs
 import numpy as np
-import scipy.ndimage as ndi
+import tcod.path
 from numpy.typing import NDArray
-import tcod
-import tcod.ecs
-import tcod.ecs.entity
-import tcod.ecs.registry
 
-from components.main import Tiles, VisibleTiles, ExploredTiles, Position, MapShape
+from mobs.mob_prefabs import MobPrefab
+from items.item_prefabs import ItemPrefab
 from constants.map_constants import (
     CA_FIRST_PASSES,
     CA_SECOND_PASSES,
     CA_MIN_WALLS,
-    CA_MIN_FLOORS
+    CA_MIN_FLOORS,
+    MAX_MONSTERS_PER_ROOM,
+    TUNNEL_WALL_COST,
+    TUNNEL_WALL_NOISE,
+    TUNNEL_ENDPOINTS,
+    TUNNEL_MARGIN,
 )
-from constants.tags import IsPlayer, InMap
-from dungeon.map_helpers import RectangularRoom, place_monsters_in_rooms, place_items_in_rooms, tunnel_between
+from dungeon.map_helpers import RectangularRoom, RoomGrid, plan_monsters_in_rooms, plan_items_in_rooms, tunnel_between
 from dungeon.tiles import TileIndices
 
 import random
 
 
+CA_KERNEL: Final = np.ones((3, 3), dtype=np.int8)
+
+
+def ndimage() -> ModuleType:
+    """Return `scipy.ndimage`, importing it on first use.
+
+    SciPy takes longer to import than the rest of the game put together, and
+    levels are usually planned in the worker process, so the game itself only
+    pays for it when it generates something."""
+    import scipy.ndimage
+    return scipy.ndimage
+
+
+@attrs.define
+class LevelPlan:
+    """A generated level as plain, picklable data, ready to be built into a registry."""
+    tiles: NDArray[np.int8]
+    player_start: tuple[int, int]
+    monsters: list[tuple[tuple[int, int], MobPrefab]]
+    items: list[tuple[tuple[int, int], ItemPrefab]]
+    depth: int
+
 
 def generate_dungeon(
-        world: tcod.ecs.Registry,
+        rng: random.Random,
         map_width: int,
         map_height: int,
         room_max_size: int,
         room_min_size: int,
         max_rooms: int,
-) -> tuple[tcod.ecs.Entity, list[RectangularRoom]]:
-    rng: random.Random = world[None].components["Random"]
-    (player,) = world.Q.all_of(tags=[IsPlayer])
-
-    map_ = world[object()]
-    shape = MapShape(map_width, map_height)
-    map_.components[Tiles] = np.full(shape.raw, TileIndices.WALL, dtype=np.int8)
-    map_.components[VisibleTiles] = np.zeros(shape.raw, dtype=np.bool)
-    map_.components[ExploredTiles] = np.full(shape.raw, TileIndices.VOID, dtype=np.int8)
-    map_.components[MapShape] = shape
-    map_tiles = map_.components[Tiles]
+) -> tuple[NDArray[np.int8], list[RectangularRoom]]:
+    """Place up to `max_rooms` non-overlapping rooms joined by tunnels."""
+    map_tiles = np.full((map_width, map_height), TileIndices.WALL, dtype=np.int8)
+    grid = RoomGrid(map_width, map_height)
 
     rooms: List[RectangularRoom] = []
 
+    def place(new_room: RectangularRoom) -> None:
+        grid.add(new_room)
+        map_tiles[new_room.inner] = TileIndices.FLOOR
+        if len(rooms) > 0:
+            # All rooms after the first
+            tunnel = tunnel_between(rng, rooms[-1].center, new_room.center)
+            map_tiles[tunnel[:, 0], tunnel[:, 1]] = TileIndices.FLOOR
+        rooms.append(new_room)
+
     for r in range(max_rooms):
         room_width = rng.randint(room_min_size, room_max_size)
         room_height = rng.randint(room_min_size, room_max_size)
 
-        x = rng.randint(0, shape.width - room_width - 1)
-        y = rng.randint(0, shape.height - room_height - 1)
+        x = rng.randint(0, map_width - room_width - 1)
+        y = rng.randint(0, map_height - room_height - 1)
 
         new_room = RectangularRoom(x, y, room_width, room_height)
 
         # discard room if it intersects another room
-        if any(new_room.intersects(other_room) for other_room in rooms):
-            continue
-
-        map_tiles[new_room.inner] = TileIndices.FLOOR
-
-        if len(rooms) == 0:
-            # First room, place player
-            player.components[Position] = Position(*new_room.center)
-            player.relation_tag[InMap] = map_
-        else:
-            # All other rooms after the first
-            for x, y in tunnel_between(world, rooms[-1].center, new_room.center):
-                map_tiles[x, y] = TileIndices.FLOOR
-
-        rooms.append(new_room)
+        if grid.is_free(new_room):
+            place(new_room)
 
-    return map_, rooms
+    return map_tiles, rooms
 
-def generate_caves(
-        world: tcod.ecs.Registry,
+def plan_caves(
+        rng: random.Random,
         map_width: int,
         map_height: int,
         room_max_size: int,
         room_min_size: int,
         max_rooms: int,
-) -> tcod.ecs.Entity:
-    print("Generating caves...")
-    rng: random.Random = world[None].components["Random"]
-    map_, rooms = generate_dungeon(world, map_width, map_height, room_max_size, room_min_size, max_rooms)
-    shape = map_.components[MapShape]
-    map_tiles = map_.components[Tiles]
-    map_tiles2 = np.copy(map_.components[Tiles])
-
-    # add random noise to walls
-    for x in range(shape.width):
-        for y in range(shape.height):
-            if x == 0 or y == 0 or x == shape.width -1 or y == shape.height-1:
-                continue
-            if (map_tiles[x, y] == TileIndices.WALL) and rng.random() < 0.55:
-                map_tiles2[x, y] = TileIndices.FLOOR
-    map_tiles = map_tiles2
+        max_monsters_per_room: int = MAX_MONSTERS_PER_ROOM,
+        depth: int = 1,
+) -> LevelPlan:
+    """Generate a cave level from `rng` alone, without touching any registry.
+
+    The player starts in the first room, so nothing is spawned there."""
+    map_tiles, rooms = generate_dungeon(rng, map_width, map_height, room_max_size, room_min_size, max_rooms)
+    player_start = rooms[0].center
+
+    # add random noise to walls, drawn in one go from a generator seeded off the level rng
+    noise_rng = np.random.default_rng(rng.getrandbits(64))
+    noise = noise_rng.random(map_tiles.shape) < 0.55
+    noise[[0, -1], :] = False # leave the border untouched
+    noise[:, [0, -1]] = False
+    map_tiles[noise & (map_tiles == TileIndices.WALL)] = TileIndices.FLOOR
 
     # apply CA to grow cave walls
     for i in range(CA_FIRST_PASSES):
-        map_tiles = cave_first_ca(map_tiles, shape)
+        map_tiles = cave_first_ca(map_tiles)
 
     for i in range(CA_SECOND_PASSES):
-        map_tiles = cave_second_ca(map_tiles, shape)
+        map_tiles = cave_second_ca(map_tiles)
 
     s = [
         [1, 1, 1],
@@ -112,81 +124,135 @@ def generate_caves(
         [1, 1, 1],
     ]
 
+    # the player start and the down stairs must end up connected, even if CA walled them in
+    anchors = [rooms[0].center, rooms[-1].center]
+    for anchor in anchors:
+        if map_tiles[anchor] == TileIndices.WALL:
+            map_tiles[anchor] = TileIndices.FLOOR
+
     # create a list of slices that represent unconnected regions
+    ndi = ndimage()
     labelled, num_features = ndi.label(map_tiles, structure=s)
+    anchor_labels = {int(labelled[anchor]) for anchor in anchors}
     regions: list[tuple[slice, slice, None]] = ndi.find_objects(labelled)
-    isolated: list[tuple[slice, slice, None]] = []
+    isolated: list[int] = []
     assert len(regions) == num_features
 
 
-    for region_slices in regions:
+    for label, region_slices in enumerate(regions, start=1):
         region = map_tiles[region_slices[0], region_slices[1]]
         region_width, region_height = (len(region), len(region[0]))
-        if (region_width < room_min_size) or (region_height < room_min_size):
+        if label in anchor_labels:
+            isolated.append(label)
+        elif (region_width < room_min_size) or (region_height < room_min_size):
             # wall in regions that are too small
             map_tiles[region_slices[0], region_slices[1]] = np.where(
-                map_tiles[region_slices[0], region_slices[1]] == TileIndices.FLOOR,
+                labelled[region_slices[0], region_slices[1]] == label,
                 TileIndices.WALL,
                 map_tiles[region_slices[0], region_slices[1]]
             )
         else:
             # add big regions to a list
-            isolated.append(region_slices)
+            isolated.append(label)
 
     # connect isolated regions
-    for r1, r2 in pairwise(isolated):
-        good = False
-        while not good:
-            good = True
-            x1, y1 = rng.randint(r1[0].start, r1[0].stop - 1), rng.randint(r1[1].start, r1[1].stop - 1)
-            x2, y2 = rng.randint(r2[0].start, r2[0].stop - 1), rng.randint(r2[1].start, r2[1].stop - 1)
-            if map_tiles[x1, y1] == TileIndices.WALL or map_tiles[x2, y2] == TileIndices.WALL:
-                good = False
-        for x, y in tunnel_between(world, (x1, y1), (x2, y2)): # TODO: more organic tunneling function
-            map_tiles[x, y] = TileIndices.FLOOR
-
-    map_.components[Tiles] = map_tiles
-
-    place_monsters_in_rooms(map_, rooms, world)
-
-    place_items_in_rooms(map_, rooms, world)
-
-    return map_
-
-def cave_first_ca(tiles_input: NDArray[np.int8], shape: MapShape) -> NDArray[np.int8]:
-    tiles_output = np.copy(tiles_input)
-    for x in range(shape.width):
-        for y in range(shape.height):
-            if check_neighbors(tiles_input, (x, y), shape, TileIndices.WALL, False) >= CA_MIN_WALLS:
-                tiles_output[x, y] = TileIndices.WALL
-    return tiles_output
-
-def cave_second_ca(tiles_input: NDArray[np.int8], shape: MapShape) -> NDArray[np.int8]:
-    tiles_output = np.copy(tiles_input)
-    for x in range(shape.width):
-        for y in range(shape.height):
-            if check_neighbors(tiles_input, (x, y), shape, TileIndices.FLOOR, True) >= CA_MIN_FLOORS:
-                tiles_output[x, y] = TileIndices.FLOOR
-    return tiles_output
-
-def check_neighbors(
+    connect_regions(noise_rng, map_tiles, labelled, isolated)
+
+    # stairs down in the last room, and up where the player arrives unless this is the top level
+    map_tiles[rooms[-1].center] = TileIndices.DOWN_STAIRS
+    if depth > 1:
+        map_tiles[rooms[0].center] = TileIndices.UP_STAIRS
+
+    monsters = plan_monsters_in_rooms(rng, map_tiles, rooms, {player_start}, max_monsters_per_room)
+    items = plan_items_in_rooms(rng, map_tiles, rooms)
+
+    return LevelPlan(map_tiles, player_start, monsters, items, depth)
+
+def connect_regions(
+        rng: np.random.Generator,
+        map_tiles: NDArray[np.int8],
+        labelled: NDArray[np.int32],
+        labels: list[int],
+) -> None:
+    """Carve tunnels joining every labelled region in `labels`, in place.
+
+    Regions are joined along a minimum spanning tree of the distances between
+    their centres. Each tunnel is the cheapest path between a handful of floor
+    cells sampled from either region, over a cost map where walls are noisy and
+    expensive, so tunnels wander and reuse open cave where they can. The path is
+    searched within the two regions' bounding boxes plus `TUNNEL_MARGIN`."""
+    if len(labels) < 2:
+        return
+    from scipy.sparse.csgraph import minimum_spanning_tree
+    centers = np.asarray(ndimage().center_of_mass(np.ones_like(labelled), labelled, labels))
+    distances = np.linalg.norm(centers[:, np.newaxis] - centers[np.newaxis, :], axis=-1)
+    tree = minimum_spanning_tree(np.triu(distances + 1)).tocoo() # +1 keeps coincident centres connected
+
+    cost = np.where(
+        map_tiles == TileIndices.WALL,
+        TUNNEL_WALL_COST + rng.integers(0, TUNNEL_WALL_NOISE + 1, map_tiles.shape),
+        1,
+    ).astype(np.int32)
+    cost[[0, -1], :] = 0 # never tunnel through the border
+    cost[:, [0, -1]] = 0
+
+    # each region's bounding box, as (x1, y1, x2, y2) with exclusive ends
+    objects = ndimage().find_objects(labelled)
+    boxes: dict[int, tuple[int, int, int, int]] = {}
+    for label in labels:
+        xs, ys = objects[label - 1]
+        boxes[label] = (xs.start, ys.start, xs.stop, ys.stop)
+    cells = {label: np.argwhere(labelled[x1:x2, y1:y2] == label) + (x1, y1) for label, (x1, y1, x2, y2) in boxes.items()}
+    def endpoints(label: int, origin: tuple[int, int]) -> list[tuple[int, int]]:
+        region_cells = cells[label]
+        picks = rng.choice(len(region_cells), size=min(TUNNEL_ENDPOINTS, len(region_cells)), replace=False)
+        return [tuple(cell) for cell in (region_cells[np.sort(picks)] - origin).tolist()]
+
+    def tunnel(a: int, b: int) -> NDArray[np.intc]:
+        # search only around the two regions, so a tunnel costs what its regions span rather than the whole map
+        x1 = max(min(boxes[a][0], boxes[b][0]) - TUNNEL_MARGIN, 0)
+        y1 = max(min(boxes[a][1], boxes[b][1]) - TUNNEL_MARGIN, 0)
+        x2 = max(boxes[a][2], boxes[b][2]) + TUNNEL_MARGIN
+        y2 = max(boxes[a][3], boxes[b][3]) + TUNNEL_MARGIN
+        path: NDArray[np.intc] = tcod.path.path2d(
+            cost[x1:x2, y1:y2],
+            start_points=endpoints(a, (x1, y1)),
+            end_points=endpoints(b, (x1, y1)),
+            cardinal=2,
+            diagonal=3,
+        )
+        return path + (x1, y1)
+
+    tunnels = np.concatenate([tunnel(labels[i], labels[j]) for i, j in zip(tree.row.tolist(), tree.col.tolist())])
+    tunnel_tiles = map_tiles[tunnels[:, 0], tunnels[:, 1]]
+    map_tiles[tunnels[:, 0], tunnels[:, 1]] = np.where(tunnel_tiles == TileIndices.WALL, TileIndices.FLOOR, tunnel_tiles)
+
+def cave_first_ca(tiles_input: NDArray[np.int8]) -> NDArray[np.int8]:
+    """Grow walls: any tile with enough wall neighbours becomes a wall.
+
+    Out-of-bounds cells count as walls."""
+    walls = count_neighbors(tiles_input, TileIndices.WALL, False)
+    return np.where(walls >= CA_MIN_WALLS, TileIndices.WALL, tiles_input).astype(np.int8)
+
+def cave_second_ca(tiles_input: NDArray[np.int8]) -> NDArray[np.int8]:
+    """Open up caves: any tile with enough floor neighbours becomes a floor.
+
+    Out-of-bounds cells are ignored."""
+    floors = count_neighbors(tiles_input, TileIndices.FLOOR, True)
+    return np.where(floors >= CA_MIN_FLOORS, TileIndices.FLOOR, tiles_input).astype(np.int8)
+
+def count_neighbors(
         tiles: NDArray[np.int8],
-        point: tuple[int, int],
-        shape: MapShape,
         tile_type: TileIndices,
         ignore_edges: bool,
-    ) -> int:
-    x, y = point
-    offsets = (-1, 0, 1)
-    count = 0
-    for i in offsets:
-        for j in offsets:
-                cur_x = x + i
-                cur_y = y + j
-                if not ((0 <= cur_x < shape.width) and (0 <= cur_y < shape.height)):
-                    if not ignore_edges:
-                        count += 1
-                    continue
-                if tiles[cur_x, cur_y] == tile_type:
-                    count += 1
-    return count
+    ) -> NDArray[np.int8]:
+    """Return, for every cell, how many cells of `tile_type` are in its 3x3 neighbourhood.
+
+    The cell itself is included in the count. Out-of-bounds cells count as
+    `tile_type` unless `ignore_edges` is set."""
+    return ndimage().convolve(
+        (tiles == tile_type).astype(np.int8),
+        CA_KERNEL,
+        mode="constant",
+        cval=0 if ignore_edges else 1,
+    )
@@ -14,6 +14,8 @@ TILES = np.asarray(
         ("wall", (ord("#"), colors.DARK_FADED_BROWN, colors.BLACK), 0, False),
         ("void", (ord(" "), colors.BLACK, colors.BLACK), 0, True),
         ("floor", (ord("."), colors.DARK_GREY, colors.BLACK), 1, True),
+        ("down_stairs", (ord(">"), colors.WHITE, colors.BLACK), 1, True),
+        ("up_stairs", (ord("<"), colors.WHITE, colors.BLACK), 1, True),
         # add new tiles here, before debug
 
         ("DEBUG", (ord("!"), colors.RED, colors.BLACK), 1, True),
@@ -31,6 +33,8 @@ class TileIndices(IntEnum):
     WALL=0 # First value in list HAS to be set to zero, as default IntEnum numbering starts at 1
     VOID=auto()
     FLOOR=auto()
+    DOWN_STAIRS=auto()
+    UP_STAIRS=auto()
     # new enumerations go here, before DEBUG, which should always be last.
 
     DEBUG=auto()
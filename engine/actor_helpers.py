@@ -7,40 +7,78 @@ import tcod.ecs
 import tcod.ecs.entity
 import tcod.map
 
-from components.main import Graphic, Position, Name, HP, HPMax, PowerMin, PowerMax, Defense, Inventory
-from components.main import Tiles, VisibleTiles, ExploredTiles
-from constants.tags import InMap, IsActor
+from components.main import Position
+from components.main import Tiles, VisibleTiles, ExploredTiles, Transparency, SpatialIndex, AI, AlertedTo
+from components.main import FovWindow, MapGraphics, EntityGlyphs, ActorStats, ActorTable
+from constants.tags import InMap, IsActor, IsAwake
 from constants.game_constants import PLAYER_FOV_RADIUS
-from dungeon.tiles import TILES
 from mobs.mob_prefabs import MobPrefab
+from engine.spawn_helpers import compile_mob
+from engine.timing import timed
 
 def create_actor(pos: tuple[int, int], prefab: MobPrefab, world: tcod.ecs.Registry) -> tcod.ecs.Entity:
-    entity = world[object()]
-    entity.components[Name] = prefab.name
-    entity.components[Position] = Position(pos[0], pos[1])
-    entity.components[Graphic] = prefab.graphic
-    for tag in prefab.tags:
-        entity.tags.add(tag)
-    if prefab.hp_max:
-        entity.components[HPMax] = prefab.hp_max
-        entity.components[HP] = prefab.hp_max
-    if prefab.power_min:
-        entity.components[PowerMin] = prefab.power_min
-    if prefab.power_max:
-        entity.components[PowerMax] = prefab.power_max
-    if prefab.defense:
-        entity.components[Defense] = prefab.defense
-    if prefab.inventory:
-        entity.components[Inventory] = Inventory(0, prefab.inventory)
-    return entity
+    return compile_mob(prefab).instantiate(world, pos)
 
+@timed("fov")
 def update_fov(entity: tcod.ecs.Entity) -> None:
+    """Update the visible and explored tiles of `entity`'s map from its point of view.
+
+    Only the square of PLAYER_FOV_RADIUS around `entity` can change, so FOV is
+    computed on that window alone and written into the existing arrays, which
+    keeps the cost of a move independent of the map's size."""
     map_: tcod.ecs.Entity = entity.relation_tag[InMap]
-    transparency = TILES["transparent"][map_.components[Tiles]]
-    map_.components[VisibleTiles] = visible = tcod.map.compute_fov(
-        transparency=transparency,
-        pov=entity.components[Position].raw,
+    pos: Position = entity.components[Position]
+    visible = map_.components[VisibleTiles]
+    previous = map_.components.get(FovWindow, None)
+    if previous is None:
+        # a new array, nothing known about where it is set
+        visible[...] = False
+    else:
+        visible[previous] = False
+
+    x0, y0 = max(pos.x - PLAYER_FOV_RADIUS, 0), max(pos.y - PLAYER_FOV_RADIUS, 0)
+    window = slice(x0, pos.x + PLAYER_FOV_RADIUS + 1), slice(y0, pos.y + PLAYER_FOV_RADIUS + 1)
+    visible[window] = tcod.map.compute_fov(
+        transparency=map_.components[Transparency][window],
+        pov=(pos.x - x0, pos.y - y0),
         radius=PLAYER_FOV_RADIUS,
         algorithm=tcod.constants.FOV_SYMMETRIC_SHADOWCAST,
     )
-    map_.components[ExploredTiles] = np.where(visible, map_.components[Tiles], map_.components[ExploredTiles])
+    np.copyto(map_.components[ExploredTiles][window], map_.components[Tiles][window], where=visible[window])
+    map_.components[FovWindow] = window
+    # the arrays were changed in place, which their change callbacks do not see
+    map_.components.pop(MapGraphics, None)
+    map_.components.pop(EntityGlyphs, None)
+
+def actor_table(map_: tcod.ecs.Entity) -> ActorTable:
+    """Return the actor table of `map_`, building it on first use. It is kept up to date from then on."""
+    table: ActorTable | None = map_.components.get(ActorStats, None)
+    if table is None:
+        table = ActorTable()
+        for e in map_.registry.Q.all_of(components=[Position], tags=[IsActor], relations=[(InMap, map_)]):
+            table.add(e)
+        map_.components[ActorStats] = table
+    return table
+
+def wake_actors_near(map_: tcod.ecs.Entity, pos: Position, radius: int, *, visible_only: bool = False) -> None:
+    """Wake every AI-controlled actor within `radius` (Chebyshev distance) of `pos`, alerting it to `pos`.
+
+    With `visible_only`, actors are still woken but only those standing on a
+    currently visible tile (and so able to see the player) are alerted."""
+    # only the window around `pos` is looked at, so the cost does not grow with the map's population
+    index: SpatialIndex = map_.components[SpatialIndex]
+    visible = map_.components[VisibleTiles]
+    x0, y0 = max(pos.x - radius, 0), max(pos.y - radius, 0)
+    xs, ys = np.nonzero(index.blocking[x0 : pos.x + radius + 1, y0 : pos.y + radius + 1])
+    for x, y in zip(xs.tolist(), ys.tolist()):
+        actor = index.actors[x0 + x, y0 + y]
+        if AI not in actor.components:
+            continue
+        actor.tags.add(IsAwake)
+        if not visible_only or visible[x0 + x, y0 + y]:
+            actor.components[AlertedTo] = pos
+
+def put_to_sleep(actor: tcod.ecs.Entity) -> None:
+    """Make an actor dormant until something wakes it again."""
+    actor.tags.discard(IsAwake)
+    actor.components.pop(AlertedTo, None)
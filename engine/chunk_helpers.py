@@ -0,0 +1,194 @@
+"""Playing on chunked maps.
+
+A chunked map keeps only a window of CHUNK_WINDOW x CHUNK_WINDOW chunks around
+the player in the registry, as ordinary dense `Tiles`, `ExploredTiles` and
+`VisibleTiles` arrays, so FOV, pathing and rendering work on it unchanged.
+Positions on the map are relative to the window's `ChunkOrigin`.
+
+When the player walks into another chunk, the window scrolls to keep the
+player's chunk in the middle: chunks and entities falling out of the window
+are written to the map's `ChunkStore`, chunks coming in are read back or
+generated, and everything still in play is moved by the same offset. Memory
+held in the registry stays the same however far the player goes.
+"""
+from __future__ import annotations
+
+import numpy as np
+import tcod.ecs
+
+from components.main import (
+    Position,
+    MapShape,
+    Tiles,
+    VisibleTiles,
+    ExploredTiles,
+    SpatialIndex,
+    AI,
+    AlertedTo,
+    ChaseMap,
+    Depth,
+    ChunkOrigin,
+    ChunkSeed,
+    ChunkStorage,
+    enter_map,
+    leave_map,
+)
+from constants.map_constants import CHUNK_SIZE, CHUNK_WINDOW
+from constants.tags import InMap, IsPlayer
+from dungeon.chunks import ChunkStore, generate_chunk
+from dungeon.procgen import ndimage
+from dungeon.tiles import TileIndices
+from engine.actor_helpers import update_fov, put_to_sleep
+from engine.level_helpers import snapshot_entity, restore_entity
+from engine.spawn_helpers import compile_mob, spawn_many
+
+
+def _translate(e: tcod.ecs.Entity, offset: tuple[int, int]) -> None:
+    """Move an entity, and every position it remembers, by `offset`."""
+    e.components[Position] = e.components[Position] + offset
+    if AlertedTo in e.components:
+        e.components[AlertedTo] = e.components[AlertedTo] + offset
+    ai = e.components.get(AI, None)
+    if isinstance(ai, SimpleEnemy):
+        ai.translate(offset)
+
+def _load_chunk(map_: tcod.ecs.Entity, chunk: tuple[int, int], tiles: np.ndarray, explored: np.ndarray) -> None:
+    """Fill one window slot with a chunk, from the store or freshly generated, and bring its entities into play."""
+    world = map_.registry
+    store: ChunkStore = map_.components[ChunkStorage]
+    ox, oy = map_.components[ChunkOrigin]
+    x0, y0 = (chunk[0] - ox) * CHUNK_SIZE, (chunk[1] - oy) * CHUNK_SIZE
+    cells = slice(x0, x0 + CHUNK_SIZE), slice(y0, y0 + CHUNK_SIZE)
+    if store.has_tiles(chunk):
+        layers = store.load_tiles(chunk)
+        tiles[cells] = layers[0]
+        explored[cells] = layers[1]
+        for snapshot in store.take_entities(chunk):
+            e = restore_entity(world, snapshot)
+            _translate(e, (-ox * CHUNK_SIZE, -oy * CHUNK_SIZE))
+            enter_map(e, map_)
+        return
+    tiles[cells], spawns = generate_chunk(map_.components[ChunkSeed], *chunk)
+    explored[cells] = TileIndices.VOID
+    if spawns:
+        positions, prefabs = zip(*spawns)
+        window_positions = np.asarray(positions) - (ox * CHUNK_SIZE, oy * CHUNK_SIZE)
+        for actor in spawn_many(world, map_, window_positions, map(compile_mob, prefabs)):
+            actor.components[AI] = SimpleEnemy()
+
+def new_chunked_map(world: tcod.ecs.Registry, seed: int, store_path: str | None = None) -> tcod.ecs.Entity:
+    """Create a chunked map around the world origin and put the player in it.
+
+    Chunks out of play are kept in a new `ChunkStore` at `store_path`, or in a
+    temporary directory without one."""
+    (player,) = world.Q.all_of(tags=[IsPlayer])
+    side = CHUNK_WINDOW * CHUNK_SIZE
+    shape = MapShape(side, side)
+    map_ = world[object()]
+    map_.components[MapShape] = shape
+    map_.components[SpatialIndex] = SpatialIndex(shape)
+    map_.components[ChunkSeed] = seed
+    map_.components[ChunkStorage] = ChunkStore(store_path)
+    map_.components[ChunkOrigin] = (-(CHUNK_WINDOW // 2), -(CHUNK_WINDOW // 2))
+    map_.components[Depth] = 0
+
+    tiles = np.empty(shape.raw, dtype=np.int8)
+    explored = np.empty(shape.raw, dtype=np.int8)
+    ox, oy = map_.components[ChunkOrigin]
+    for i in range(CHUNK_WINDOW):
+        for j in range(CHUNK_WINDOW):
+            _load_chunk(map_, (ox + i, oy + j), tiles, explored)
+
+    # start on the floor nearest the middle of the window, in its biggest open area rather than a pocket
+    labelled, _ = ndimage().label(tiles == TileIndices.FLOOR, structure=np.ones((3, 3), dtype=bool))
+    biggest = np.argmax(np.bincount(labelled.ravel())[1:]) + 1
+    floors = np.argwhere(labelled == biggest)
+    x, y = floors[np.argmin(np.abs(floors - side // 2).sum(axis=1))].tolist()
+    blocker = map_.components[SpatialIndex].actors.get((x, y), None)
+    if blocker is not None:
+        # nothing spawns on top of the player
+        leave_map(blocker)
+        blocker.clear()
+    player.components[Position] = Position(x, y)
+    enter_map(player, map_)
+
+    map_.components[Tiles] = tiles
+    map_.components[ExploredTiles] = explored
+    map_.components[VisibleTiles] = np.zeros(shape.raw, dtype=np.bool)
+    return map_
+
+def scroll_window(player: tcod.ecs.Entity) -> None:
+    """Scroll a chunked map's window so the player's chunk is in the middle. Does nothing on other maps."""
+    map_ = player.relation_tag[InMap]
+    if ChunkOrigin not in map_.components:
+        return
+    world = map_.registry
+    px, py = player.components[Position].raw
+    dcx = px // CHUNK_SIZE - CHUNK_WINDOW // 2
+    dcy = py // CHUNK_SIZE - CHUNK_WINDOW // 2
+    if dcx == 0 and dcy == 0:
+        return
+    store: ChunkStore = map_.components[ChunkStorage]
+    ox, oy = map_.components[ChunkOrigin]
+    tiles = map_.components[Tiles]
+    explored = map_.components[ExploredTiles]
+
+    def in_new_window(i: int, j: int) -> bool:
+        return 0 <= i - dcx < CHUNK_WINDOW and 0 <= j - dcy < CHUNK_WINDOW
+
+    # write out the chunks and entities leaving the window, in world coordinates
+    leaving: dict[tuple[int, int], list] = {}
+    entities = list(world.Q.all_of(components=[Position], relations=[(InMap, map_)]).none_of(tags=[IsPlayer]))
+    staying = [player]
+    for e in entities:
+        pos = e.components[Position]
+        i, j = pos.x // CHUNK_SIZE, pos.y // CHUNK_SIZE
+        if in_new_window(i, j):
+            staying.append(e)
+            continue
+        leave_map(e)
+        put_to_sleep(e)
+        _translate(e, (ox * CHUNK_SIZE, oy * CHUNK_SIZE))
+        leaving.setdefault((ox + i, oy + j), []).append(snapshot_entity(e))
+        e.clear()
+    for i in range(CHUNK_WINDOW):
+        for j in range(CHUNK_WINDOW):
+            if not in_new_window(i, j):
+                cells = slice(i * CHUNK_SIZE, (i + 1) * CHUNK_SIZE), slice(j * CHUNK_SIZE, (j + 1) * CHUNK_SIZE)
+                store.save_tiles((ox + i, oy + j), tiles[cells], explored[cells])
+    for chunk, snapshots in leaving.items():
+        store.save_entities(chunk, snapshots)
+
+    # move what stays by the scroll offset; the index is rebuilt afterwards rather than patched move by move
+    offset = (-dcx * CHUNK_SIZE, -dcy * CHUNK_SIZE)
+    shape: MapShape = map_.components[MapShape]
+    map_.components.pop(SpatialIndex)
+    map_.components.pop(ChaseMap, None)
+    for e in staying:
+        _translate(e, offset)
+    index = SpatialIndex(shape)
+    for e in staying:
+        index.add(e, e.components[Position])
+    map_.components[SpatialIndex] = index
+
+    # shift the kept chunks into place, then fill the new slots
+    new_tiles = np.empty_like(tiles)
+    new_explored = np.empty_like(explored)
+    map_.components[ChunkOrigin] = (ox + dcx, oy + dcy)
+    for i in range(CHUNK_WINDOW):
+        for j in range(CHUNK_WINDOW):
+            old_i, old_j = i + dcx, j + dcy
+            if 0 <= old_i < CHUNK_WINDOW and 0 <= old_j < CHUNK_WINDOW:
+                new_cells = slice(i * CHUNK_SIZE, (i + 1) * CHUNK_SIZE), slice(j * CHUNK_SIZE, (j + 1) * CHUNK_SIZE)
+                old_cells = slice(old_i * CHUNK_SIZE, (old_i + 1) * CHUNK_SIZE), slice(old_j * CHUNK_SIZE, (old_j + 1) * CHUNK_SIZE)
+                new_tiles[new_cells] = tiles[old_cells]
+                new_explored[new_cells] = explored[old_cells]
+            else:
+                _load_chunk(map_, (ox + dcx + i, oy + dcy + j), new_tiles, new_explored)
+    map_.components[Tiles] = new_tiles
+    map_.components[ExploredTiles] = new_explored
+    map_.components[VisibleTiles] = np.zeros(shape.raw, dtype=np.bool)
+    update_fov(player)
+
+
+from actions.actions import SimpleEnemy
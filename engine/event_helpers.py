@@ -0,0 +1,22 @@
+from __future__ import annotations
+
+from typing import Iterable
+
+import tcod.event
+
+
+def coalesce_key_repeats(events: Iterable[tcod.event.Event]) -> list[tcod.event.Event]:
+    """Return `events` with every auto-repeated key press after the first of its key dropped.
+
+    Repeats pile up while a held key's turns take longer than the repeat rate;
+    handling only one per batch stops the player running on after the key is released."""
+    kept: list[tcod.event.Event] = []
+    repeated: set[tuple[int, int]] = set()
+    for event in events:
+        if isinstance(event, tcod.event.KeyDown) and event.repeat:
+            key = (event.sym, event.mod)
+            if key in repeated:
+                continue
+            repeated.add(key)
+        kept.append(event)
+    return kept
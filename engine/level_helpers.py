@@ -0,0 +1,276 @@
+"""Building and moving between dungeon levels.
+
+Only the level the player is on lives in the registry. Every other level is
+kept as a compressed snapshot in the world's `Levels` component, and is
+rebuilt into the registry when the player returns to it.
+
+Levels below the first are planned from their own child seed, so the next
+level down is generated in a worker process while the current one is played,
+and only has to be built into the registry when the player takes the stairs.
+The worker only runs between `start_pool` and `shutdown_pool`, which the game
+calls from `main`. Without it, levels are planned in this process when they
+are needed, so headless tools never start a subprocess.
+"""
+from __future__ import annotations
+
+import multiprocessing
+import pickle
+import zlib
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from random import Random
+from typing import Any
+
+import numpy as np
+import tcod.ecs
+
+from components.main import (
+    Position,
+    MapShape,
+    Tiles,
+    VisibleTiles,
+    ExploredTiles,
+    SpatialIndex,
+    WalkCost,
+    AI,
+    Depth,
+    Levels,
+    DungeonSeed,
+    PendingLevels,
+    ActorStats,
+    EntityGlyphs,
+    enter_map,
+    enter_map_many,
+)
+from constants.map_constants import (
+    MAP_WIDTH,
+    MAP_HEIGHT,
+    ROOM_MAX_SIZE,
+    ROOM_MIN_SIZE,
+    MAX_ROOMS,
+    MAX_MONSTERS_PER_ROOM,
+)
+from constants.tags import ActiveMap, InMap, IsPlayer
+from dungeon.procgen import LevelPlan, plan_caves
+from dungeon.tiles import TileIndices
+from engine.actor_helpers import update_fov
+from engine.spawn_helpers import compile_mob, compile_item, spawn_many
+
+
+# map components stored in a snapshot, everything else on a map is derived or a cache
+MAP_COMPONENTS = (MapShape, Tiles, VisibleTiles, ExploredTiles, Depth)
+
+_executor: ProcessPoolExecutor | None = None
+
+
+def start_pool() -> None:
+    """Start the worker process levels are planned in, if it is not running yet."""
+    global _executor
+    if _executor is None:
+        # spawned rather than forked, so the worker does not inherit the window
+        _executor = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+        # the worker is only launched on the first submit, so launch it now rather than when the first plan is due
+        _executor.submit(int)
+
+def shutdown_pool() -> None:
+    """Stop the worker process, dropping plans not started yet and waiting for the one underway."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(cancel_futures=True)
+        _executor = None
+
+def build_level(world: tcod.ecs.Registry, plan: LevelPlan) -> tcod.ecs.Entity:
+    """Create a map entity and its spawns from `plan`, and put the player at its start."""
+    (player,) = world.Q.all_of(tags=[IsPlayer])
+    shape = MapShape(*plan.tiles.shape)
+    map_ = world[object()]
+    map_.components[VisibleTiles] = np.zeros(shape.raw, dtype=np.bool)
+    map_.components[ExploredTiles] = np.full(shape.raw, TileIndices.VOID, dtype=np.int8)
+    map_.components[MapShape] = shape
+    map_.components[SpatialIndex] = SpatialIndex(shape)
+    map_.components[Tiles] = plan.tiles
+    map_.components[Depth] = plan.depth
+
+    player.components[Position] = Position(*plan.player_start)
+    enter_map(player, map_)
+    if plan.monsters:
+        positions, mob_prefabs = zip(*plan.monsters)
+        for actor in spawn_many(world, map_, positions, map(compile_mob, mob_prefabs)):
+            actor.components[AI] = SimpleEnemy()
+    if plan.items:
+        positions, item_prefabs = zip(*plan.items)
+        spawn_many(world, map_, positions, map(compile_item, item_prefabs))
+    return map_
+
+def plan_first_level(
+        seed: int,
+        map_width: int = MAP_WIDTH,
+        map_height: int = MAP_HEIGHT,
+        max_rooms: int = MAX_ROOMS,
+        max_monsters_per_room: int = MAX_MONSTERS_PER_ROOM,
+) -> tuple[LevelPlan, Random]:
+    """Plan the first level of a new world from its seed, and return it with the world's Random as planning left it.
+
+    Can run in the worker process: the returned Random carries on exactly as if
+    the level had been planned in the game's own."""
+    print("Generating caves...")
+    rng = Random()
+    rng.seed(seed)
+    plan = plan_caves(rng, map_width, map_height, ROOM_MAX_SIZE, ROOM_MIN_SIZE, max_rooms, max_monsters_per_room)
+    return plan, rng
+
+def pregenerate_first_level(seed: int) -> Future[tuple[LevelPlan, Random]]:
+    """Start planning the first level of a new world in the background, see `take_first_level`.
+
+    Without a running pool, the level is planned here and the future is already done."""
+    if _executor is not None:
+        return _executor.submit(plan_first_level, seed)
+    future: Future[tuple[LevelPlan, Random]] = Future()
+    future.set_result(plan_first_level(seed))
+    return future
+
+def take_first_level(seed: int, future: Future[tuple[LevelPlan, Random]]) -> tuple[LevelPlan, Random]:
+    """Return the result of `pregenerate_first_level`, planning it here if the worker died."""
+    try:
+        return future.result()
+    except BrokenProcessPool:
+        global _executor
+        _executor = None
+    return plan_first_level(seed)
+
+def plan_level(seed: int, depth: int) -> LevelPlan:
+    """Plan the level at `depth` from the dungeon seed alone. Runs in the worker process."""
+    rng = Random(f"{seed}/{depth}")
+    return plan_caves(rng, MAP_WIDTH, MAP_HEIGHT, ROOM_MAX_SIZE, ROOM_MIN_SIZE, MAX_ROOMS, depth=depth)
+
+def dungeon_seed(world: tcod.ecs.Registry) -> int:
+    """Return the world's dungeon seed, drawn when the world was created."""
+    seed: int = world[None].components[DungeonSeed]
+    return seed
+
+def pregenerate_level(world: tcod.ecs.Registry, depth: int) -> None:
+    """Start planning the level at `depth` in the background, unless it exists or is already underway.
+
+    Does nothing without a running pool; the level is planned when it is needed instead."""
+    if _executor is None:
+        return
+    pending = world[None].components.setdefault(PendingLevels, {})
+    if depth in pending or depth in world[None].components.get(Levels, {}):
+        return
+    pending[depth] = _executor.submit(plan_level, dungeon_seed(world), depth)
+
+def take_level_plan(world: tcod.ecs.Registry, depth: int) -> LevelPlan:
+    """Return the plan for `depth`, from the background worker if it was pre-generated."""
+    future = world[None].components.get(PendingLevels, {}).pop(depth, None)
+    if future is not None:
+        try:
+            plan: LevelPlan = future.result()
+            return plan
+        except BrokenProcessPool:
+            global _executor
+            _executor = None
+    print("Generating caves...")
+    return plan_level(dungeon_seed(world), depth)
+
+
+def snapshot_entity(e: tcod.ecs.Entity) -> tuple[dict[Any, Any], set[Any]]:
+    """Return an entity's components and tags as plain data for `restore_entity`."""
+    # position tags are added back by on_position_changed when the position is restored
+    tags = {tag for tag in e.tags if not isinstance(tag, Position)}
+    return dict(e.components.items()), tags
+
+def restore_entity(world: tcod.ecs.Registry, snapshot: tuple[dict[Any, Any], set[Any]]) -> tcod.ecs.Entity:
+    """Create an entity from a `snapshot_entity` snapshot. It is not put in any map."""
+    components, tags = snapshot
+    e = world[object()]
+    e.tags |= tags
+    for key, value in components.items():
+        e.components[key] = value
+    return e
+
+def stash_level(map_: tcod.ecs.Entity) -> None:
+    """Compress `map_` and everything in it except the player into the world's `Levels`, then remove them from the registry."""
+    world = map_.registry
+    entities = list(world.Q.all_of(relations=[(InMap, map_)]).none_of(tags=[IsPlayer]))
+    snapshot = (
+        {key: map_.components[key] for key in MAP_COMPONENTS},
+        [snapshot_entity(e) for e in entities],
+    )
+    levels = world[None].components.setdefault(Levels, {})
+    levels[map_.components[Depth]] = zlib.compress(pickle.dumps(snapshot, protocol=5), 1)
+    # the whole map goes, so drop its index and caches first rather than updating them entity by entity
+    for key in (SpatialIndex, ActorStats, EntityGlyphs):
+        map_.components.pop(key, None)
+    for e in entities:
+        e.clear()
+    map_.clear()
+
+def restore_level(world: tcod.ecs.Registry, depth: int) -> tcod.ecs.Entity:
+    """Rebuild a stashed level into the registry and return its map."""
+    map_components, entities = pickle.loads(zlib.decompress(world[None].components[Levels].pop(depth)))
+    map_ = world[object()]
+    map_.components[SpatialIndex] = SpatialIndex(map_components[MapShape])
+    for key, value in map_components.items():
+        map_.components[key] = value
+    enter_map_many([restore_entity(world, snapshot) for snapshot in entities], map_)
+    return map_
+
+def free_cell_near(map_: tcod.ecs.Entity, pos: Position) -> Position:
+    """Return the walkable cell closest to `pos` that no blocking actor stands on, `pos` itself if it is free."""
+    walkable = (map_.components[WalkCost] != 0) & ~map_.components[SpatialIndex].blocking
+    shape = map_.components[MapShape]
+    for radius in range(max(shape.raw)):
+        x0, y0 = max(pos.x - radius, 0), max(pos.y - radius, 0)
+        window = walkable[x0 : pos.x + radius + 1, y0 : pos.y + radius + 1]
+        if window.any():
+            # nearest by Chebyshev distance; ties go to the first in row order
+            x, y = np.argwhere(window)[0].tolist()
+            return Position(x0 + x, y0 + y)
+    raise ValueError("No free cell in the map.")
+
+def change_level(player: tcod.ecs.Entity, depth: int) -> None:
+    """Move the player to the given depth, generating the level if it has never been visited.
+
+    The player arrives on the up stairs when going down, and on the down stairs when going up."""
+    world = player.registry
+    old_map = player.relation_tag[InMap]
+    going_down = depth > old_map.components[Depth]
+    stash_level(old_map)
+
+    if depth in world[None].components.get(Levels, {}):
+        map_ = restore_level(world, depth)
+        arrival = TileIndices.UP_STAIRS if going_down else TileIndices.DOWN_STAIRS
+        x, y = np.argwhere(map_.components[Tiles] == arrival)[0].tolist()
+        player.components[Position] = free_cell_near(map_, Position(x, y))
+        enter_map(player, map_)
+    else:
+        map_ = build_level(world, take_level_plan(world, depth))
+    world[None].relation_tag[ActiveMap] = map_
+    update_fov(player)
+    pregenerate_level(world, depth + 1)
+
+def reroll_dungeon(player: tcod.ecs.Entity) -> None:
+    """Swap the dungeon for one grown from a new seed, rebuilding the player's current depth from it.
+
+    A debug aid: stashed and pending levels belong to the old dungeon, so they are dropped."""
+    world = player.registry
+    globals_ = world[None]
+    old_map = player.relation_tag[InMap]
+    depth = old_map.components[Depth]
+    # drawn from the world so recorded sessions replay
+    globals_.components[DungeonSeed] = globals_.components["Random"].getrandbits(64)
+    print(f"Dungeon seed: {globals_.components[DungeonSeed]}")
+    globals_.components.pop(Levels, None)
+    for future in globals_.components.pop(PendingLevels, {}).values():
+        future.cancel()
+    for e in list(world.Q.all_of(relations=[(InMap, old_map)]).none_of(tags=[IsPlayer])):
+        e.clear()
+    old_map.clear()
+    pregenerate_level(world, depth)
+    map_ = build_level(world, take_level_plan(world, depth))
+    globals_.relation_tag[ActiveMap] = map_
+    update_fov(player)
+    pregenerate_level(world, depth + 1)
+
+
+from actions.actions import SimpleEnemy
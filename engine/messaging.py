@@ -3,14 +3,13 @@ from __future__ import annotations
 import tcod.ecs
 
 import constants.colors as colors
-from components.message_log import MessageLog, Message
+from components.message_log import MessageLog
 
 
-def add_message(world: tcod.ecs.Registry, text: str, fg: str = "WHITE"):
-    """Append a message to the message log, stacking if necessary."""
+def add_message(world: tcod.ecs.Registry, text: str, fg: str = "WHITE", stack: bool = True):
+    """Append a message to the message log, stacking if necessary.
+
+    Refusals pass `stack=False`, so asking again doesn't count up the same message."""
     assert hasattr(colors, fg), fg
-    log: list[Message] = world[None].components[MessageLog]
-    if log and log[-1] == text:
-        log[-1].count += 1
-        return
-    log.append(Message(text, fg))
+    log: MessageLog = world[None].components[MessageLog]
+    log.add(text, fg, stack)
@@ -1,32 +1,36 @@
 from __future__ import annotations
 
+import numpy as np
+from numpy.typing import NDArray
 import tcod.ecs
 import tcod.path
 
-from components.main import Position, Tiles
+from components.main import Position, WalkCost, ChaseMap, SpatialIndex, ExploredTiles
+from dungeon.tiles import TILES, TileIndices
 from constants.game_constants import PATH_COST_INCREASE
-from constants.tags import IsActor, InMap
-from dungeon.tiles import TILES
+from constants.tags import InMap
+from engine.timing import timed
 
 
 
+def crowded_cost(map_: tcod.ecs.Entity) -> NDArray[np.int8]:
+    """Return a fresh walk cost array for `map_`, with the cost of tiles holding an actor increased."""
+    # Copy walkable array.
+    cost = np.copy(map_.components[WalkCost])
+
+    # Add to the cost of every walkable position holding a blocking actor.
+    # A lower number means enemies will crowd behind each other in hallways.
+    # A higher number means enemies will take longer paths to surround the player.
+    cost[map_.components[SpatialIndex].blocking & (cost != 0)] += PATH_COST_INCREASE
+    return cost
+
+@timed("path_to")
 def path_to(actor: tcod.ecs.Entity, dest: Position) -> list[Position]:
     """Compute and return a path from actor to destination.
 
     If there is no valid path, return empty list."""
     map_ = actor.relation_tag[InMap]
-
-    # Copy walkable array.
-    cost = TILES["walk_cost"][map_.components[Tiles]]
-
-    for other in actor.registry.Q.all_of(tags=[IsActor], relations=[(InMap, map_)]):
-        other_pos = other.components[Position]
-        # check that an entity blocks movement and the cost isn't zero (blocking).:
-        if cost[other_pos.raw]:
-            # Add to the cost of a blocking position.
-            # A lower number means enemies will crowd behind each other in hallways.
-            # A higher number means enemies will take longer paths to surround the player.
-            cost[other_pos.raw] += PATH_COST_INCREASE
+    cost = crowded_cost(map_)
 
     # Create a graph from the cost array and pass that graph to a new pathfinder.
     graph = tcod.path.SimpleGraph(cost=cost, cardinal=2, diagonal=3)
@@ -40,3 +44,74 @@ def path_to(actor: tcod.ecs.Entity, dest: Position) -> list[Position]:
 
     # Convert from List[List[int]] to List[Tuple[int, int]]
     return [Position(raw_index[0], raw_index[1]) for raw_index in path]
+
+@timed("chase_map")
+def chase_map(map_: tcod.ecs.Entity, target: tcod.ecs.Entity) -> NDArray[np.int32]:
+    """Return the distance map towards `target` for this turn.
+
+    The map is computed on first use and cached on `map_` as `ChaseMap`,
+    so every actor chasing `target` shares a single Dijkstra pass.
+    `do_enemy_actions` clears it at the start of each turn."""
+    dist: NDArray[np.int32] | None = map_.components.get(ChaseMap, None)
+    if dist is not None:
+        return dist
+    cost = crowded_cost(map_)
+    dist = tcod.path.maxarray(cost.shape, dtype=np.int32)
+    dist[target.components[Position].raw] = 0
+    tcod.path.dijkstra2d(dist, cost, 2, 3, out=dist)
+    map_.components[ChaseMap] = dist
+    return dist
+
+def step_downhill(pos: Position, dist: NDArray[np.int32], blocking: NDArray[np.bool], goal: Position) -> Position | None:
+    """Return the free neighbour of `pos` closest to the root of `dist`.
+
+    `dist` may be costed before other actors moved this turn, so neighbours where
+    `blocking` is set are skipped, except `goal` itself.
+    Returns None if no free neighbour is closer than `pos` itself."""
+    x0, y0 = max(pos.x - 1, 0), max(pos.y - 1, 0)
+    window = dist[x0 : pos.x + 2, y0 : pos.y + 2]
+    blocked = blocking[x0 : pos.x + 2, y0 : pos.y + 2].copy()
+    gx, gy = goal.x - x0, goal.y - y0
+    if 0 <= gx < blocked.shape[0] and 0 <= gy < blocked.shape[1]:
+        blocked[gx, gy] = False
+    window = np.where(blocked, np.iinfo(dist.dtype).max, window)
+    x, y = np.unravel_index(np.argmin(window), window.shape)
+    if window[x, y] >= dist[pos.raw]:
+        return None
+    return Position(x0 + int(x), y0 + int(y))
+
+def known_cost(map_: tcod.ecs.Entity) -> NDArray[np.int8]:
+    """Return a walk cost array for `map_` as far as the player knows it: tiles never seen cannot be walked."""
+    cost: NDArray[np.int8] = TILES["walk_cost"][map_.components[ExploredTiles]]
+    return cost
+
+@timed("command_map")
+def explore_map(map_: tcod.ecs.Entity) -> NDArray[np.int32]:
+    """Return the distances through explored tiles to the nearest tile never seen."""
+    unexplored = map_.components[ExploredTiles] == TileIndices.VOID
+    cost = known_cost(map_)
+    # the goals must be walkable, or dijkstra2d does not spread from them
+    cost[unexplored] = 1
+    dist = tcod.path.maxarray(cost.shape, dtype=np.int32)
+    dist[unexplored] = 0
+    tcod.path.dijkstra2d(dist, cost, 2, 3, out=dist)
+    return dist
+
+@timed("command_map")
+def travel_map(map_: tcod.ecs.Entity, dest: Position) -> NDArray[np.int32]:
+    """Return the distances through explored tiles to `dest`."""
+    cost = known_cost(map_)
+    dist = tcod.path.maxarray(cost.shape, dtype=np.int32)
+    dist[dest.raw] = 0
+    tcod.path.dijkstra2d(dist, cost, 2, 3, out=dist)
+    return dist
+
+def downhill_steps(pos: Position, dist: NDArray[np.int32]) -> list[tuple[int, int]]:
+    """Return the steps, as offsets, that descend `dist` from `pos` to one of its roots.
+
+    Empty if `pos` is a root or no root can be reached from it."""
+    if dist[pos.raw] == np.iinfo(dist.dtype).max:
+        return []
+    path = tcod.path.hillclimb2d(dist, pos.raw, True, True)
+    steps: list[tuple[int, int]] = np.diff(path, axis=0).tolist()
+    return [(dx, dy) for dx, dy in steps]
@@ -1,16 +1,24 @@
 from __future__ import annotations
 
-from typing import Reversible
+from typing import Any
 
 import numpy as np
+from numpy.typing import NDArray
 import tcod.console
+import tcod.constants
 import tcod.ecs.registry
 import tcod.ecs.entity
 
 import constants.colors as colors
-from constants.tags import IsActor, IsPlayer, InMap, ActiveMap
-from constants.game_constants import SCREEN_W, SCREEN_H
-from constants.gui_constants import HEALTH_BAR_WIDTH, MESSAGE_LOG_WIDTH, MESSAGE_LOG_HEIGHT
+from constants.tags import IsPlayer, InMap, ActiveMap
+from constants.gui_constants import (
+    VIEWPORT_WIDTH,
+    VIEWPORT_HEIGHT,
+    HEALTH_BAR_WIDTH,
+    MESSAGE_LOG_WIDTH,
+    MESSAGE_LOG_HEIGHT,
+    TIMING_OVERLAY_WIDTH,
+)
 from components.main import (
     Position,
     Graphic,
@@ -18,48 +26,101 @@ from components.main import (
     Tiles,
     VisibleTiles,
     ExploredTiles,
+    MapGraphics,
+    EntityGlyphs,
+    SpatialIndex,
     HP,
     HPMax,
 )
-from components.message_log import MessageLog, Message
+from components.message_log import MessageLog
 from dungeon.tiles import TILES
+from engine.timing import PHASES, profiler, timed
 
 
 
-def render_all_entities(console: tcod.console.Console, world: tcod.ecs.Registry) -> None:
-    (player,) = world.Q.all_of(tags=[IsPlayer])
-    actor_drawn = set()
-    for entity in world.Q.all_of(components=[Position, Graphic], relations=[(InMap, world[None].relation_tag[ActiveMap])]):
-        if IsPlayer in entity.tags:
-            continue # Always draw player last
-        if entity.components[Position].raw in actor_drawn:
-            continue # Do not draw over actor
-        if IsActor in entity.tags:
-            actor_drawn.add(entity.components[Position].raw)
-        render_entity(console, entity)
-    render_entity(console, player)
-
-def render_entity(console: tcod.console.Console, entity: tcod.ecs.Entity) -> None:
-    x, y = entity.components[Position].raw
-    if not (0 <= x < SCREEN_W and 0 <= y < SCREEN_H):
-        return
-    visible = entity.relation_tag[InMap].components[VisibleTiles]
-    if not visible[x, y]:
-        return
-    graphic = entity.components[Graphic]
-    console.print(x, y, graphic.char, graphic.fg)
-
-def render_map(console: tcod.console.Console, world: tcod.ecs.Registry) -> None:
-    map_ = world[None].relation_tag[ActiveMap]
+def camera_origin(map_: tcod.ecs.Entity, focus: Position) -> tuple[int, int]:
+    """Return the map position drawn at the top left of the viewport.
+
+    The viewport is centred on `focus`, but never scrolls past the map's edges."""
     shape = map_.components[MapShape]
-    tiles = map_.components[Tiles]
-    explored = map_.components[ExploredTiles]
-    visible = map_.components[VisibleTiles]
+    x = min(max(focus.x - VIEWPORT_WIDTH // 2, 0), max(shape.width - VIEWPORT_WIDTH, 0))
+    y = min(max(focus.y - VIEWPORT_HEIGHT // 2, 0), max(shape.height - VIEWPORT_HEIGHT, 0))
+    return x, y
+
+def screen_to_map(map_: tcod.ecs.Entity, focus: Position, tile: tuple[int, int]) -> Position | None:
+    """Return the map position drawn at console tile `tile` with the camera on `focus`, or None if none is drawn there."""
+    x, y = tile
+    if not (0 <= x < VIEWPORT_WIDTH and 0 <= y < VIEWPORT_HEIGHT):
+        return None
+    origin_x, origin_y = camera_origin(map_, focus)
+    shape = map_.components[MapShape]
+    pos = Position(origin_x + x, origin_y + y)
+    if not (pos.x < shape.width and pos.y < shape.height):
+        return None
+    return pos
+
+def viewport(origin: tuple[int, int]) -> tuple[slice, slice]:
+    """Return the slices of a map's arrays shown in the viewport at `origin`."""
+    x, y = origin
+    return slice(x, x + VIEWPORT_WIDTH), slice(y, y + VIEWPORT_HEIGHT)
+
+@timed("render_entities")
+def render_all_entities(console: tcod.console.Console, world: tcod.ecs.Registry, origin: tuple[int, int]) -> None:
+    map_ = world[None].relation_tag[ActiveMap]
+    for x, y, graphic in entity_glyphs(map_, origin):
+        console.print(x, y, graphic.char, graphic.fg)
+
+def entity_glyphs(map_: tcod.ecs.Entity, origin: tuple[int, int]) -> list[tuple[int, int, Graphic]]:
+    """Return the topmost visible entity of each viewport cell, in screen coordinates, rebuilding the cached list if needed.
+
+    Only the visible cells of the viewport are looked up in the map's spatial index,
+    so the cost does not depend on how many entities the whole map holds.
+    Actors are drawn over items, and items over everything else."""
+    cached: tuple[tuple[int, int], list[tuple[int, int, Graphic]]] | None = map_.components.get(EntityGlyphs, None)
+    if cached is not None and cached[0] == origin:
+        return cached[1]
+    index: SpatialIndex = map_.components[SpatialIndex]
+    x0, y0 = origin
+    xs, ys = np.nonzero(map_.components[VisibleTiles][viewport(origin)])
+    glyphs: list[tuple[int, int, Graphic]] = []
+    for x, y in zip(xs.tolist(), ys.tolist()):
+        pos = (x0 + x, y0 + y)
+        entity = index.actors.get(pos, None)
+        if entity is None:
+            stack = index.items.get(pos, None) or index.others.get(pos, None)
+            if not stack:
+                continue
+            entity = stack[-1]
+        glyphs.append((x, y, entity.components[Graphic]))
+    map_.components[EntityGlyphs] = (origin, glyphs)
+    return glyphs
+
+@timed("render_map")
+def render_map(console: tcod.console.Console, world: tcod.ecs.Registry, origin: tuple[int, int]) -> None:
+    map_ = world[None].relation_tag[ActiveMap]
+    graphics = map_graphics(map_, origin)
+    console.rgb[:graphics.shape[0], :graphics.shape[1]] = graphics
+
+def map_graphics(map_: tcod.ecs.Entity, origin: tuple[int, int]) -> NDArray[Any]:
+    """Return the tile graphics of the viewport at `origin`, lit where visible and dimmed where only remembered.
+
+    Only the viewport's slice of the map is converted. The result is cached on
+    the map until the viewport moves or the tiles, visibility or explored tiles change."""
+    cached: tuple[tuple[int, int], NDArray[Any]] | None = map_.components.get(MapGraphics, None)
+    if cached is not None and cached[0] == origin:
+        return cached[1]
+    view = viewport(origin)
+    tiles = map_.components[Tiles][view]
+    explored = map_.components[ExploredTiles][view]
+    visible = map_.components[VisibleTiles][view]
     not_visible = ~visible
 
-    console.rgb[:shape.width, :shape.height] = TILES["graphic"][np.where(visible, tiles, explored)]
-    console.rgb["fg"][:shape.width, :shape.height][not_visible] //= 2
+    graphics = TILES["graphic"][np.where(visible, tiles, explored)]
+    graphics["fg"][not_visible] //= 2
+    map_.components[MapGraphics] = (origin, graphics)
+    return graphics
 
+@timed("render_bar")
 def render_bar(
         console: tcod.console.Console,
         current_val: int,
@@ -74,6 +135,7 @@ def render_bar(
 
     console.print(x=1, y=45, string=f"HP: {current_val}/{max_val}", fg=colors.WHITE)
 
+@timed("render_messages")
 def render_messages(
         world: tcod.ecs.Registry,
         width: int,
@@ -81,22 +143,45 @@ def render_messages(
 ) -> tcod.console.Console:
     """Return a console with the message log rendered onto it..
 
-    Messages are rendered starting at the last entry and working back."""
-    messages: Reversible[Message] = world[None].components[MessageLog]
+    Messages are rendered starting at the last entry and working back.
+    The console is reused until the log changes."""
+    log: MessageLog = world[None].components[MessageLog]
+    key = (log.version, width, height)
+    if log.rendered is not None and log.rendered[0] == key:
+        return log.rendered[1]
     console = tcod.console.Console(width, height)
 
     y = height
 
-    for message in reversed(messages):
-        y -= tcod.console.get_height_rect(width, message.full_text)
+    for message in reversed(log):
+        y -= message.height(width)
         console.print_box(x=0, y=y, width=width, height=height, string=message.full_text, fg=message.fg)
         if y <= 0:
             break
+    log.rendered = (key, console)
     return console
 
+@timed("render")
 def render_main(console: tcod.console.Console, world: tcod.ecs.Registry):
     (player,) = world.Q.all_of(tags=[IsPlayer])
-    render_map(console, world)
-    render_all_entities(console, world)
+    origin = camera_origin(player.relation_tag[InMap], player.components[Position])
+    render_map(console, world, origin)
+    render_all_entities(console, world, origin)
     render_bar(console, player.components[HP], player.components[HPMax], HEALTH_BAR_WIDTH)
     render_messages(world, width=MESSAGE_LOG_WIDTH, height=MESSAGE_LOG_HEIGHT).blit(console, dest_x=21, dest_y=45)
+
+def render_timing_overlay(console: tcod.console.Console) -> None:
+    """Draw the rolling mean and p99 of every timed phase in the top right corner."""
+    stats = profiler.stats()
+    width = TIMING_OVERLAY_WIDTH
+    x = console.width - width
+    console.draw_frame(x=x, y=0, width=width, height=len(PHASES) + 3, title="Timing (ms)", fg=colors.WHITE, bg=colors.BLACK)
+    console.print(x + 1, 1, f"{'phase':<18}{'mean':>7}{'p99':>7}", fg=colors.GREY)
+    for i, (name, depth) in enumerate(PHASES):
+        mean, p99 = stats[name]
+        label = " " * depth + name
+        console.print(x + 1, i + 2, f"{label:<18}{mean:>7.2f}{p99:>7.2f}", fg=colors.WHITE)
+
+def render_loading(console: tcod.console.Console, text: str) -> None:
+    """Draw `text` in the middle of the screen, shown while the game starts."""
+    console.print(console.width // 2, console.height // 2, text, fg=colors.WHITE, alignment=tcod.constants.CENTER)
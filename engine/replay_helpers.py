@@ -0,0 +1,121 @@
+"""Recording play sessions so they can be replayed exactly.
+
+A recording is a small header holding the world seed, then one fixed-size
+record per key press or mouse click handed to `State.on_event`: what kind of
+event it was, the key and its modifiers or the button and the clicked tile, and
+a checksum of the world after the event was handled. Key presses and clicks are
+the only events any state reacts to, so nothing else is recorded.
+
+Replaying feeds the same events to a world built from the same seed and compares
+checksums turn by turn, so the first event after which the game diverged is
+known exactly (see `tools.replay`).
+"""
+from __future__ import annotations
+
+import struct
+import zlib
+from typing import BinaryIO
+
+import numpy as np
+import tcod.ecs
+import tcod.event
+
+from components.main import Position, Inventory, Depth
+from constants.tags import ActiveMap, InMap, IsItem, IsPlayer
+from engine.actor_helpers import actor_table
+
+
+RECORDING_FORMAT_VERSION = 2
+MAGIC = b"YARTREC\0"
+HEADER = struct.Struct("<8sIQ") # magic, format version, world seed
+EVENT = struct.Struct("<BiHhhI") # event kind, key sym or button, modifiers, clicked tile, world checksum after the event
+KEY_DOWN = 0
+MOUSE_BUTTON_DOWN = 1
+
+
+class RecordingFormatError(Exception):
+    """A recording is damaged or was written by an incompatible version."""
+
+
+def world_checksum(world: tcod.ecs.Registry) -> int:
+    """Return a CRC32 of the state that decides how the game plays out.
+
+    Covers the world's Random, the current depth, every actor's position and
+    hitpoints, every item on the floor and the player's inventory size.
+    Entities are sorted, so the result does not depend on query order. Actors
+    are read from the map's `ActorTable` columns rather than one by one."""
+    map_ = world[None].relation_tag[ActiveMap]
+    (player,) = world.Q.all_of(tags=[IsPlayer])
+    table = actor_table(map_)
+    xs, ys, hps = table.column("x"), table.column("y"), table.column("hp")
+    order = np.lexsort((hps, ys, xs))
+    actors = np.stack([xs[order], ys[order], hps[order]], axis=1)
+    items = sorted(e.components[Position].raw for e in world.Q.all_of(components=[Position], tags=[IsItem], relations=[(InMap, map_)]))
+    _, rng_state, _ = world[None].components["Random"].getstate()
+
+    crc = zlib.crc32(np.asarray(rng_state, dtype=np.uint32))
+    crc = zlib.crc32(np.ascontiguousarray(actors, dtype=np.int32), crc)
+    crc = zlib.crc32(np.asarray(items, dtype=np.int32), crc)
+    return zlib.crc32(struct.pack("<ii", map_.components[Depth], player.components[Inventory].size), crc)
+
+
+class Recorder:
+    """Appends key presses, clicks and world checksums to a recording file.
+
+    Pass the seed to start a new recording. Without one, events are appended to
+    the existing recording at `path`, which is how a session resumed from a save
+    continues the recording of the game that was saved."""
+    def __init__(self, path: str, seed: int | None = None) -> None:
+        self.file: BinaryIO
+        if seed is not None:
+            self.file = open(path, "wb")
+            self.file.write(HEADER.pack(MAGIC, RECORDING_FORMAT_VERSION, seed))
+        else:
+            read_header(path)
+            self.file = open(path, "ab")
+
+    def record(self, event: tcod.event.Event, world: tcod.ecs.Registry) -> None:
+        """Record `event` if it is a key press or a click. Call this after the event was handled.
+
+        Clicks must already be converted to console tiles."""
+        if isinstance(event, tcod.event.KeyDown):
+            self.file.write(EVENT.pack(KEY_DOWN, event.sym, event.mod, 0, 0, world_checksum(world)))
+        elif isinstance(event, tcod.event.MouseButtonDown):
+            x, y = int(event.position.x), int(event.position.y)
+            self.file.write(EVENT.pack(MOUSE_BUTTON_DOWN, event.button, 0, x, y, world_checksum(world)))
+
+    def close(self) -> None:
+        self.file.close()
+
+
+def read_header(path: str) -> int:
+    """Check the header of the recording at `path` and return its seed."""
+    with open(path, "rb") as f:
+        header = f.read(HEADER.size)
+    if len(header) < HEADER.size:
+        raise RecordingFormatError(f"{path} is too short to be a recording.")
+    magic, version, seed = HEADER.unpack(header)
+    if magic != MAGIC:
+        raise RecordingFormatError(f"{path} is not a recording.")
+    if version != RECORDING_FORMAT_VERSION:
+        raise RecordingFormatError(f"{path} uses recording format {version}, but only {RECORDING_FORMAT_VERSION} is supported.")
+    return int(seed)
+
+def read_recording(path: str) -> tuple[int, list[tuple[tcod.event.KeyDown | tcod.event.MouseButtonDown, int]]]:
+    """Return the seed of the recording at `path`, and its key presses and clicks with their checksums."""
+    seed = read_header(path)
+    with open(path, "rb") as f:
+        data = f.read()[HEADER.size:]
+    if len(data) % EVENT.size:
+        # a session that was killed mid-write; everything before the torn record is still good
+        data = data[: len(data) - len(data) % EVENT.size]
+    events = [(recorded_event(kind, code, mod, x, y), checksum) for kind, code, mod, x, y, checksum in EVENT.iter_unpack(data)]
+    return seed, events
+
+def recorded_event(kind: int, code: int, mod: int, x: int, y: int) -> tcod.event.KeyDown | tcod.event.MouseButtonDown:
+    """Rebuild an event from the fields of its record."""
+    if kind == KEY_DOWN:
+        return tcod.event.KeyDown(scancode=0, sym=tcod.event.KeySym(code), mod=tcod.event.Modifier(mod))
+    if kind == MOUSE_BUTTON_DOWN:
+        return tcod.event.MouseButtonDown(pixel=(x, y), tile=(x, y), button=tcod.event.MouseButton(code))
+    raise RecordingFormatError(f"Unknown event kind {kind} in recording.")
@@ -0,0 +1,94 @@
+"""Saving and loading the whole world.
+
+A save file is a small header, then a pickle of the registry (the sidecar:
+entities, components, tags, relations and the world's Random state), then
+every NumPy array the pickle refers to as a raw, 64-byte aligned buffer.
+Arrays are pickled out-of-band, so loading maps the buffers straight from
+the file instead of copying them through the pickle stream.
+
+Only the arrays get this treatment. Entities and their other components are
+rebuilt one at a time by unpickling the registry, so load time still grows
+with the number of entities.
+"""
+from __future__ import annotations
+
+import mmap
+import os
+import pickle
+import struct
+
+import tcod.ecs
+
+from components.main import MapGraphics, EntityGlyphs, ChaseMap, PendingLevels, ActorStats
+from components.message_log import MessageLog
+
+
+SAVE_FORMAT_VERSION = 1
+MAGIC = b"YARTSAVE"
+HEADER = struct.Struct("<8sIIQ") # magic, format version, buffer count, sidecar size
+BUFFER_ENTRY = struct.Struct("<QQ") # offset, size
+ALIGNMENT = 64
+
+# components which are only caches, rebuilt on demand, and not worth saving
+CACHE_COMPONENTS = (MapGraphics, EntityGlyphs, ChaseMap, PendingLevels, ActorStats)
+
+
+class SaveFormatError(Exception):
+    """A save file is damaged or was written by an incompatible version."""
+
+
+def _align(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+def save_world(world: tcod.ecs.Registry, path: str) -> None:
+    """Write `world` to `path`, replacing any existing save only once the new one is complete."""
+    for component in CACHE_COMPONENTS:
+        for entity in list(world.Q.all_of(components=[component])):
+            entity.components.pop(component)
+    world[None].components[MessageLog].rendered = None
+
+    buffers: list[pickle.PickleBuffer] = []
+    sidecar = pickle.dumps(world, protocol=5, buffer_callback=buffers.append)
+    raw_buffers = [buffer.raw() for buffer in buffers]
+
+    offset = _align(HEADER.size + BUFFER_ENTRY.size * len(raw_buffers) + len(sidecar))
+    table = []
+    for raw in raw_buffers:
+        table.append((offset, raw.nbytes))
+        offset = _align(offset + raw.nbytes)
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, SAVE_FORMAT_VERSION, len(raw_buffers), len(sidecar)))
+        for entry in table:
+            f.write(BUFFER_ENTRY.pack(*entry))
+        f.write(sidecar)
+        for (buffer_offset, _), raw in zip(table, raw_buffers):
+            f.seek(buffer_offset)
+            f.write(raw)
+    os.replace(tmp_path, path)
+
+def load_world(path: str) -> tcod.ecs.Registry:
+    """Load a world saved with `save_world`.
+
+    The file is mapped copy-on-write: arrays are paged in as they are used and
+    can be modified freely without touching the file on disk. Everything else
+    is copied out of the pickle as usual."""
+    with open(path, "rb") as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    view = memoryview(data)
+    if len(view) < HEADER.size:
+        raise SaveFormatError(f"{path} is too short to be a save file.")
+    magic, version, buffer_count, sidecar_size = HEADER.unpack_from(view)
+    if magic != MAGIC:
+        raise SaveFormatError(f"{path} is not a save file.")
+    if version != SAVE_FORMAT_VERSION:
+        raise SaveFormatError(f"{path} uses save format {version}, but only {SAVE_FORMAT_VERSION} is supported.")
+
+    table_end = HEADER.size + BUFFER_ENTRY.size * buffer_count
+    buffers = [
+        view[offset : offset + size]
+        for offset, size in BUFFER_ENTRY.iter_unpack(view[HEADER.size : table_end])
+    ]
+    world: tcod.ecs.Registry = pickle.loads(view[table_end : table_end + sidecar_size], buffers=buffers)
+    return world
@@ -0,0 +1,81 @@
+"""Creating entities from prefabs.
+
+A prefab is compiled once into a `Template`, the components and tags every
+entity made from it starts with, so spawning is a handful of bulk writes rather
+than a check per prefab field. `spawn_many` creates a whole batch of entities in
+a map at once, filling the map's index in a single pass.
+"""
+from __future__ import annotations
+
+import functools
+from typing import Any, Callable, Iterable, Sequence
+
+import attrs
+import numpy as np
+from numpy.typing import NDArray
+import tcod.ecs
+
+from components.main import Graphic, Position, Name, HP, HPMax, PowerMin, PowerMax, Defense, Inventory, enter_map_many
+from components.item_effects import Healing
+from items.item_prefabs import ItemPrefab
+from mobs.mob_prefabs import MobPrefab
+
+
+@attrs.define(frozen=True)
+class Template:
+    """The starting components and tags of entities made from one prefab."""
+    components: dict[Any, Any]
+    """Immutable component values, shared by every entity made from the template."""
+    tags: frozenset[Any]
+    fresh: tuple[tuple[Any, Callable[[], Any]], ...] = ()
+    """Mutable components, made anew for every entity."""
+
+    def instantiate(self, world: tcod.ecs.Registry, pos: tuple[int, int]) -> tcod.ecs.Entity:
+        """Create an entity from this template at `pos`, not yet in any map."""
+        entity = world[object()]
+        components = entity.components
+        for key, value in self.components.items():
+            components[key] = value
+        for key, factory in self.fresh:
+            components[key] = factory()
+        components[Position] = Position(*pos)
+        entity.tags |= self.tags
+        return entity
+
+@functools.cache
+def compile_mob(prefab: MobPrefab) -> Template:
+    components: dict[Any, Any] = {Name: prefab.name, Graphic: prefab.graphic}
+    if prefab.hp_max:
+        components[HPMax] = prefab.hp_max
+        components[HP] = prefab.hp_max
+    if prefab.power_min:
+        components[PowerMin] = prefab.power_min
+    if prefab.power_max:
+        components[PowerMax] = prefab.power_max
+    if prefab.defense:
+        components[Defense] = prefab.defense
+    fresh: tuple[tuple[Any, Callable[[], Any]], ...] = ()
+    if prefab.inventory:
+        fresh = ((Inventory, functools.partial(Inventory, 0, prefab.inventory)),)
+    return Template(components, frozenset(prefab.tags), fresh)
+
+@functools.cache
+def compile_item(prefab: ItemPrefab) -> Template:
+    components: dict[Any, Any] = {Name: prefab.name, Graphic: prefab.graphic}
+    if prefab.healing:
+        components[Healing] = prefab.healing
+    return Template(components, frozenset(prefab.tags))
+
+def spawn_many(
+        world: tcod.ecs.Registry,
+        map_: tcod.ecs.Entity,
+        positions: NDArray[np.intp] | Sequence[tuple[int, int]],
+        templates: Iterable[Template],
+) -> list[tcod.ecs.Entity]:
+    """Create an entity from each template at the matching position, all put in `map_` together."""
+    entities = [
+        template.instantiate(world, pos)
+        for pos, template in zip(np.asarray(positions, dtype=np.intp).reshape(-1, 2).tolist(), templates)
+    ]
+    enter_map_many(entities, map_)
+    return entities
@@ -6,7 +6,8 @@ from tcod.console import Console
 class State(Protocol):
     __slots__ = ()
 
-    def on_event(self, event: Event) -> None:
+    def on_event(self, event: Event) -> "State | None":
+        """Handle an event and return the state to carry on in, or None if the event changed nothing."""
         pass
     def on_draw(self, console: Console) -> None:
         pass
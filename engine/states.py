@@ -7,16 +7,18 @@ from tcod.event import KeySym
 
 
 import constants.colors as colors
-from constants.tags import IsPlayer, IsItem, InInventory, IsQuaffable
-from constants.controls import MOVEMENT_KEYS, WAIT_KEYS, SELECT_KEYS
+from constants.tags import IsPlayer, IsItem, InInventory, IsQuaffable, InMap
+from constants.controls import MOVEMENT_KEYS, WAIT_KEYS, EXPLORE_KEYS, REST_KEYS, SELECT_KEYS
 from constants.gui_constants import ITEM_SELECT_FRAME_WIDTH, ITEM_SELECT_FRAME_HEIGHT
-from components.main import Name, HP, HPMax, Inventory
-from engine.render_helpers import render_main
+from components.main import Name, HP, HPMax, Inventory, Position
+from engine.render_helpers import render_main, screen_to_map
+from engine.timing import profiler
 from engine.item_helpers import create_item
 from items.item_prefabs import health_potion
 from actions.action import Action
-from actions.actions import Bump, GetItem, DropItem, QuaffItem, escape_action, regenenerate_map, reveal_map, wait_action
-from actions.action_helpers import do_player_action
+from actions.actions import Bump, GetItem, DropItem, QuaffItem, TakeStairs, escape_action, regenenerate_map, reveal_map, wait_action
+from actions.action_helpers import do_player_action, do_player_command
+from actions.commands import explore, travel, rest
 from engine.state import State
 
 
@@ -27,13 +29,27 @@ class BaseState(State):
 
 class DefaultState(BaseState):
     """The default mode, wherein the player is exploring the dungeon."""
-    def on_event(self, event: tcod.event.Event) -> State:
+    def on_event(self, event: tcod.event.Event) -> State | None:
         (player,) = self.world.Q.all_of(tags=[IsPlayer])
         match event:
             case tcod.event.KeyDown(sym=sym) if sym in MOVEMENT_KEYS:
                 return do_player_action(self, player, Bump(*MOVEMENT_KEYS[sym]))
+            case tcod.event.KeyDown(sym=KeySym.PERIOD, mod=mod) if mod & tcod.event.Modifier.SHIFT:
+                return do_player_action(self, player, TakeStairs(1)) # ">"
+            case tcod.event.KeyDown(sym=KeySym.COMMA, mod=mod) if mod & tcod.event.Modifier.SHIFT:
+                return do_player_action(self, player, TakeStairs(-1)) # "<"
             case tcod.event.KeyDown(sym=sym) if sym in WAIT_KEYS:
                 return do_player_action(self, player, wait_action)
+            case tcod.event.KeyDown(sym=sym) if sym in EXPLORE_KEYS:
+                return do_player_command(self, player, explore(player))
+            case tcod.event.KeyDown(sym=sym) if sym in REST_KEYS:
+                return do_player_command(self, player, rest(player))
+            case tcod.event.MouseButtonDown(button=tcod.event.MouseButton.LEFT, position=position):
+                # travel to the clicked tile; the event's position must already be converted to tiles
+                dest = screen_to_map(player.relation_tag[InMap], player.components[Position], (int(position.x), int(position.y)))
+                if dest is None:
+                    return None
+                return do_player_command(self, player, travel(player, dest))
             case tcod.event.KeyDown(sym=KeySym.g):
                 return do_player_action(self, player, GetItem())
             case tcod.event.KeyDown(sym=KeySym.d):
@@ -58,6 +74,11 @@ class DefaultState(BaseState):
                     item = create_item((0, 0), health_potion, self.world)
                     item.relation_tag[InInventory] = player
                 player.components[Inventory].size = 26
+            case tcod.event.KeyDown(sym=KeySym.F5):
+                # toggle the timing overlay
+                profiler.toggle()
+            case _:
+                return None
         return self
 
     def on_draw(self, console: Console) -> None:
@@ -65,10 +86,10 @@ class DefaultState(BaseState):
 
 class GameOverState(BaseState):
     """The player has died - they cannot move and must restart or load a save."""
-    def on_event(self, event: tcod.event.Event) -> State:
+    def on_event(self, event: tcod.event.Event) -> State | None:
         if event.type == "KEYDOWN" and event.sym == KeySym.ESCAPE:
             raise SystemExit()
-        return self
+        return None
 
     def on_draw(self, console: Console) -> None:
         render_main(console, self.world)
@@ -116,7 +137,7 @@ class SelectItem(BaseState):
             on_cancel=DefaultState
         )
 
-    def on_event(self, event: tcod.event.Event) -> State:
+    def on_event(self, event: tcod.event.Event) -> State | None:
         match event:
             case tcod.event.KeyDown(sym=sym) if sym in {ord(c) for c in SELECT_KEYS}:
                 index = SELECT_KEYS.index(chr(sym))
@@ -125,7 +146,7 @@ class SelectItem(BaseState):
             case tcod.event.KeyDown(sym=KeySym.ESCAPE):
                 if self.on_cancel is not None:
                     return self.on_cancel(self.world)
-        return self
+        return None
 
     def on_draw(self, console: Console) -> None:
         render_main(console, self.world)
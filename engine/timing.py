@@ -0,0 +1,123 @@
+"""Per-phase timing of the main loop.
+
+Functions are wrapped with `@timed(phase)` and blocks with `with phase_timer(phase):`.
+While `profiler.enabled` is False both cost a single attribute check, so they
+stay in place in normal play. Time spent in a phase is summed over the frame,
+and phases include whatever they call: `enemies` is also counted in `player`.
+"""
+from __future__ import annotations
+
+import csv
+import functools
+import time
+from collections import deque
+from typing import Any, Callable, Final, TextIO, TypeVar
+
+import numpy as np
+
+from constants.gui_constants import TIMING_WINDOW
+
+
+# every phase, in display order, with its nesting depth for the overlay
+PHASES: Final = (
+    ("wait", 0),
+    ("player", 0),
+    ("command_map", 1),
+    ("enemies", 1),
+    ("chase_map", 2),
+    ("path_to", 2),
+    ("fov", 1),
+    ("render", 0),
+    ("render_map", 1),
+    ("render_entities", 1),
+    ("render_bar", 1),
+    ("render_messages", 1),
+    ("present", 0),
+)
+PHASE_NAMES: Final = tuple(name for name, _ in PHASES)
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+class Profiler:
+    """Collects the time spent in each phase per frame, keeping the last `window` frames."""
+    def __init__(self, window: int = TIMING_WINDOW) -> None:
+        self.enabled = False
+        self.samples: dict[str, deque[float]] = {name: deque(maxlen=window) for name in PHASE_NAMES}
+        self._frame: dict[str, float] = dict.fromkeys(PHASE_NAMES, 0.0)
+        self._frame_count = 0
+        self._csv_file: TextIO | None = None
+        self._csv: Any = None
+
+    def add(self, phase: str, seconds: float) -> None:
+        self._frame[phase] += seconds
+
+    def end_frame(self) -> None:
+        """Close the current frame's samples, streaming them to CSV if enabled."""
+        if not self.enabled:
+            return
+        for name, seconds in self._frame.items():
+            self.samples[name].append(seconds)
+        if self._csv is not None:
+            self._csv.writerow([self._frame_count, *(f"{self._frame[name] * 1000:.4f}" for name in PHASE_NAMES)])
+        self._frame_count += 1
+        self._frame = dict.fromkeys(PHASE_NAMES, 0.0)
+
+    def toggle(self) -> None:
+        self.enabled = not self.enabled
+        self._frame = dict.fromkeys(PHASE_NAMES, 0.0)
+
+    def stream_csv(self, path: str) -> None:
+        """Enable timing and write every frame's samples, in milliseconds, to `path`."""
+        self._csv_file = open(path, "w", newline="")
+        self._csv = csv.writer(self._csv_file)
+        self._csv.writerow(["frame", *PHASE_NAMES])
+        self.enabled = True
+
+    def close(self) -> None:
+        if self._csv_file is not None:
+            self._csv_file.close()
+            self._csv_file = self._csv = None
+
+    def stats(self) -> dict[str, tuple[float, float]]:
+        """Return the rolling mean and p99 of each phase, in milliseconds."""
+        report: dict[str, tuple[float, float]] = {}
+        for name, samples in self.samples.items():
+            ms = np.asarray(samples or [0.0]) * 1000
+            report[name] = (float(ms.mean()), float(np.percentile(ms, 99)))
+        return report
+
+profiler = Profiler()
+
+
+def timed(phase: str) -> Callable[[F], F]:
+    """Decorate a function so the time spent in it is counted towards `phase`."""
+    assert phase in PHASE_NAMES, phase
+    def decorator(func: F) -> F:
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if not profiler.enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profiler.add(phase, time.perf_counter() - start)
+        return wrapper # type: ignore[return-value]
+    return decorator
+
+class phase_timer:
+    """Count the time spent in a `with` block towards `phase`."""
+    __slots__ = ("phase", "start")
+
+    def __init__(self, phase: str) -> None:
+        self.phase = phase
+        self.start = 0.0
+
+    def __enter__(self) -> None:
+        if profiler.enabled:
+            self.start = time.perf_counter()
+
+    def __exit__(self, *exc: object) -> None:
+        if profiler.enabled and self.start:
+            profiler.add(self.phase, time.perf_counter() - self.start)
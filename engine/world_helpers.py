@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+from random import Random
+
+import tcod.ecs
+
+from mobs.mob_prefabs import player as player_prefab
+from constants.map_constants import (
+    MAP_WIDTH,
+    MAP_HEIGHT,
+    MAX_ROOMS,
+    MAX_MONSTERS_PER_ROOM,
+)
+from constants.tags import ActiveMap, IsPlayer
+from components.main import DungeonSeed
+from components.message_log import MessageLog
+from dungeon.procgen import LevelPlan
+from engine.actor_helpers import create_actor, update_fov
+from engine.level_helpers import build_level, plan_first_level, pregenerate_level
+from engine.chunk_helpers import new_chunked_map
+
+
+
+def new_world(
+        seed: int,
+        map_width: int = MAP_WIDTH,
+        map_height: int = MAP_HEIGHT,
+        max_rooms: int = MAX_ROOMS,
+        max_monsters_per_room: int = MAX_MONSTERS_PER_ROOM,
+        chunked: bool = False,
+        pregenerate: bool = False,
+        chunk_store_path: str | None = None,
+) -> tcod.ecs.Registry:
+    """Create a new world with a player standing in a freshly generated map.
+
+    This is the headless entry point: by default nothing is planned in the
+    background, and later levels are planned when the player reaches them.
+    With `pregenerate`, the second level is planned in the level worker like
+    the game does, if `engine.level_helpers.start_pool` was called.
+
+    With `chunked`, the player starts on an endless chunked overworld instead
+    of the first cave level, and the map size arguments are ignored. Its chunks
+    are stored at `chunk_store_path`, or in a temporary directory without one."""
+    if not chunked:
+        plan, rng = plan_first_level(seed, map_width, map_height, max_rooms, max_monsters_per_room)
+        return build_world(plan, rng, pregenerate=pregenerate)
+    rng = Random()
+    rng.seed(seed)
+    world = _new_registry(rng)
+    map_ = new_chunked_map(world, rng.getrandbits(64), chunk_store_path)
+    _enter_first_map(world, map_)
+    return world
+
+def build_world(plan: LevelPlan, rng: Random, *, pregenerate: bool = True) -> tcod.ecs.Registry:
+    """Create a new world from the plan of its first level and the Random it left, see `plan_first_level`.
+
+    With `pregenerate`, the second level starts planning in the level worker straight away."""
+    world = _new_registry(rng)
+    _enter_first_map(world, build_level(world, plan))
+    if pregenerate:
+        pregenerate_level(world, 2)
+    return world
+
+def _new_registry(rng: Random) -> tcod.ecs.Registry:
+    world = tcod.ecs.Registry()
+    world[None].components["Random"] = rng
+    # drawn up front, so the world's Random is in the same state whether or not levels are pregenerated
+    world[None].components[DungeonSeed] = rng.getrandbits(64)
+    create_actor((0, 0), player_prefab, world)
+    world[None].components[MessageLog] = MessageLog()
+    return world
+
+def _enter_first_map(world: tcod.ecs.Registry, map_: tcod.ecs.Entity) -> None:
+    (player,) = world.Q.all_of(tags=[IsPlayer])
+    world[None].relation_tag[ActiveMap] = map_
+    update_fov(player)
@@ -1,3 +1,5 @@
+from typing import Final
+
 import attrs
 
 from components.main import Graphic
@@ -10,12 +12,15 @@ import constants.colors as colors
 class ItemPrefab:
     name: str
     graphic: Graphic
-    tags: list[str]
+    tags: tuple[str, ...]
     healing: int | None
 
 health_potion = ItemPrefab(
     name="Health Potion",
     graphic=Graphic("!", colors.MAGENTA),
-    tags=[IsItem, IsQuaffable],
+    tags=(IsItem, IsQuaffable),
     healing=10,
 )
+
+# items spawned in levels, with their relative weights
+ITEM_SPAWNS: Final = ((health_potion, 1),)
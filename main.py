@@ -1,58 +1,57 @@
 #!/usr/bin/env python3
 import time
+STARTED = time.perf_counter() # before the heavy imports, so the startup report includes them
+
+import os
+import sys
 import traceback
-from random import Random
 
 import tcod
 import tcod.ecs
 
-from mobs.mob_prefabs import player as player_prefab
 from constants.game_constants import *
-from constants.map_constants import *
-from constants.tags import ActiveMap
-from components.message_log import MessageLog
 from engine.game_globals import *
-from engine.actor_helpers import create_actor, update_fov
 from engine.messaging import add_message
 from engine.state import State
-from engine.states import DefaultState
-from dungeon.procgen import generate_caves
+from engine.states import DefaultState, GameOverState
+from engine.world_helpers import build_world, new_world
+from engine.save_helpers import save_world, load_world
+from engine.level_helpers import pregenerate_level, pregenerate_first_level, take_first_level, start_pool, shutdown_pool
+from engine.replay_helpers import Recorder
+from engine.event_helpers import coalesce_key_repeats
+from engine.render_helpers import render_timing_overlay, render_loading
+from engine.timing import profiler, phase_timer
+from components.main import Depth, ChunkOrigin, ChunkStorage
+from constants.tags import ActiveMap
 
 
 
 def main() -> None:
+    # levels are planned in a worker process while the game runs; start it before anything needs it
+    start_pool()
+    try:
+        play()
+    finally:
+        shutdown_pool()
+
+def play() -> None:
     tileset: tcod.tileset.Tileset = tcod.tileset.load_tilesheet(
         FONT_PATH,
         FONT_COLS,
         FONT_ROWS,
         tcod.tileset.CHARMAP_CP437,
     )
-    seed = int(time.time())
-    print(f"Seed: {seed}")
     root_console = tcod.console.Console(SCREEN_W, SCREEN_H, order="F")
 
-    world = tcod.ecs.Registry()
-    rng = Random()
-    rng.seed(seed)
-    world[None].components["Random"] = rng
-    player = create_actor((0, 0), player_prefab, world)
-
-    map_ = generate_caves(
-        world,
-        MAP_WIDTH,
-        MAP_HEIGHT,
-        ROOM_MAX_SIZE,
-        ROOM_MIN_SIZE,
-        MAX_ROOMS,
-    )
-    world[None].relation_tag[ActiveMap] = map_
-
-    game_state: State = DefaultState(world)
-
-    world[None].components[MessageLog] = MessageLog()
-
-    update_fov(player)
+    if TIMING_CSV_PATH is not None:
+        profiler.stream_csv(TIMING_CSV_PATH)
 
+    # open the window straight away, and plan a new world's first level in the worker meanwhile
+    seed = int(time.time())
+    resuming = os.path.exists(SAVE_PATH)
+    # a new game starts on the chunked overworld instead of in the caves with --overworld
+    overworld = not resuming and "--overworld" in sys.argv[1:]
+    first_level = None if resuming or overworld else pregenerate_first_level(seed)
     with tcod.context.new_terminal(
         SCREEN_W,
         SCREEN_H,
@@ -61,18 +60,95 @@ def main() -> None:
         vsync=WINDOW_VSYNC,
         sdl_window_flags=FLAGS,
     ) as context:
-
-        while True:
-            root_console.clear()
-            game_state.on_draw(root_console)
-
-            context.present(root_console)
-            for event in tcod.event.wait():
-                try:
-                    game_state = game_state.on_event(event)
-                except Exception as err:
-                    traceback.print_exc()
-                    add_message(world, f"{str(err)}", "RED")
+        root_console.clear()
+        render_loading(root_console, "Loading..." if resuming else "Generating...")
+        context.present(root_console)
+        if profiler.enabled:
+            print(f"First frame after {(time.perf_counter() - STARTED) * 1000:.0f} ms")
+
+        recorder: Recorder | None = None
+        if resuming:
+            print(f"Loading {SAVE_PATH}")
+            world = load_world(SAVE_PATH)
+            map_ = world[None].relation_tag[ActiveMap]
+            if ChunkOrigin not in map_.components:
+                pregenerate_level(world, map_.components[Depth] + 1)
+            if os.path.exists(RECORDING_PATH):
+                recorder = Recorder(RECORDING_PATH)
+        elif overworld:
+            print(f"Seed: {seed}")
+            world = new_world(seed, chunked=True, chunk_store_path=CHUNK_STORE_PATH)
+            # recordings replay a cave game from its seed, so overworld games are not recorded
+            if os.path.exists(RECORDING_PATH):
+                os.remove(RECORDING_PATH)
+        else:
+            assert first_level is not None
+            print(f"Seed: {seed}")
+            while not first_level.done():
+                # keep the window responsive while the level is planned
+                for event in tcod.event.wait(timeout=0.05):
+                    if isinstance(event, tcod.event.Quit):
+                        # nothing to save yet
+                        profiler.close()
+                        return
+            world = build_world(*take_first_level(seed, first_level))
+            recorder = Recorder(RECORDING_PATH, seed)
+        if profiler.enabled:
+            print(f"Ready after {(time.perf_counter() - STARTED) * 1000:.0f} ms")
+        game_state: State = DefaultState(world)
+
+        try:
+            dirty = True
+            while True:
+                # only draw when something changed; idle mouse motion and unbound keys cost nothing
+                if dirty:
+                    root_console.clear()
+                    game_state.on_draw(root_console)
+                    if profiler.enabled:
+                        render_timing_overlay(root_console)
+
+                    with phase_timer("present"):
+                        context.present(root_console)
+                    profiler.end_frame()
+                    dirty = False
+                with phase_timer("wait"):
+                    events = coalesce_key_repeats(tcod.event.wait())
+                for event in events:
+                    if isinstance(event, tcod.event.Quit):
+                        raise SystemExit()
+                    if isinstance(event, tcod.event.WindowEvent):
+                        # the window may need its contents back
+                        dirty = True
+                    if isinstance(event, tcod.event.MouseButtonDown):
+                        # states expect clicks in console tiles, not window pixels
+                        event = context.convert_event(event)
+                    try:
+                        new_state = game_state.on_event(event)
+                        if new_state is not None:
+                            game_state = new_state
+                            dirty = True
+                    except Exception as err:
+                        traceback.print_exc()
+                        add_message(world, f"{str(err)}", "RED")
+                        dirty = True
+                    finally:
+                        if recorder is not None:
+                            recorder.record(event, world)
+        except SystemExit:
+            if isinstance(game_state, GameOverState):
+                # dead characters stay dead
+                if os.path.exists(SAVE_PATH):
+                    os.remove(SAVE_PATH)
+                map_ = world[None].relation_tag[ActiveMap]
+                if ChunkStorage in map_.components:
+                    map_.components[ChunkStorage].delete()
+            else:
+                save_world(world, SAVE_PATH)
+            raise
+        finally:
+            if recorder is not None:
+                recorder.close()
+            profiler.close()
 
 
 
@@ -5,8 +5,8 @@ from random import Random
 import tcod.ecs
 
 import constants.colors as colors
-from constants.tags import IsPlayer, IsActor
-from components.main import AI, HP, HPMax, Defense, Graphic, Name, PowerMin, PowerMax
+from constants.tags import IsPlayer, IsActor, InMap
+from components.main import AI, HP, HPMax, Defense, Graphic, Name, PowerMin, PowerMax, Position, SpatialIndex, actor_table_of
 from engine.messaging import add_message
 
 
@@ -45,4 +45,11 @@ def die(entity: tcod.ecs.Entity) -> None:
     entity.components[Name] = f"remains of {entity.components[Name]}"
     if not is_player:
         entity.components.pop(AI)
+    # remains no longer block, so take them out of the map's index before they lose their actor tag
+    index = entity.relation_tag[InMap].components[SpatialIndex]
+    index.discard(entity, entity.components[Position])
+    table = actor_table_of(entity)
+    if table is not None:
+        table.discard(entity)
     entity.tags.remove(IsActor)
+    index.add(entity, entity.components[Position])
@@ -6,11 +6,11 @@ from components.main import Graphic
 from constants.tags import IsActor, IsBlocking, IsPlayer
 
 
-@dataclass
+@dataclass(frozen=True)
 class MobPrefab:
     name: str
     graphic: Graphic
-    tags: list[str]
+    tags: tuple[str, ...]
     hp_max: int | None = None
     power_min: int | None = None
     power_max: int | None = None
@@ -25,7 +25,7 @@ player = MobPrefab(
     power_max=5,
     defense=2,
     inventory=26,
-    tags=[IsPlayer, IsActor, IsBlocking],
+    tags=(IsPlayer, IsActor, IsBlocking),
 )
 orc = MobPrefab(
     name="Orc",
@@ -34,7 +34,7 @@ orc = MobPrefab(
     power_min=2,
     power_max=4,
     defense=0,
-    tags=[IsActor, IsBlocking],
+    tags=(IsActor, IsBlocking),
 )
 troll = MobPrefab(
     name="Troll",
@@ -43,5 +43,8 @@ troll = MobPrefab(
     power_min=3,
     power_max=6,
     defense=1,
-    tags=[IsActor, IsBlocking],
+    tags=(IsActor, IsBlocking),
 )
+
+# monsters spawned in levels and chunks, with their relative weights
+MONSTER_SPAWNS: Final = ((orc, 8), (troll, 2))
@@ -0,0 +1,54 @@
+"""Patching tiles with `set_tiles` must leave every derived layer as a full rebuild would."""
+from __future__ import annotations
+
+from typing import Any
+
+import numpy as np
+import pytest
+import tcod.ecs
+
+from components.main import Position, Tiles, VisibleTiles, WalkCost, Transparency
+from constants.tags import InMap, IsPlayer
+from dungeon.map_helpers import set_tiles
+from dungeon.tiles import TileIndices
+from engine.render_helpers import camera_origin, map_graphics
+from engine.world_helpers import new_world
+
+
+def derived_layers(map_: tcod.ecs.Entity, origin: tuple[int, int]) -> dict[str, Any]:
+    return {
+        "walk_cost": map_.components[WalkCost].copy(),
+        "transparency": map_.components[Transparency].copy(),
+        "graphics": map_graphics(map_, origin).copy(),
+    }
+
+def patches(player_pos: Position, visible: np.ndarray) -> list[tuple[Any, TileIndices]]:
+    """A single cell, a block and a scattered mask around the player, all in view so the graphics show them."""
+    x, y = player_pos.raw
+    mask = visible.copy()
+    mask[::2, :] = False
+    return [
+        ((x + 1, y), TileIndices.WALL),
+        ((slice(x - 2, x + 1), slice(y - 1, y + 2)), TileIndices.FLOOR),
+        (mask, TileIndices.DOWN_STAIRS),
+    ]
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_set_tiles_matches_rebuild(seed: int) -> None:
+    world = new_world(seed)
+    (player,) = world.Q.all_of(tags=[IsPlayer])
+    map_ = player.relation_tag[InMap]
+    origin = camera_origin(map_, player.components[Position])
+    map_graphics(map_, origin) # cache the viewport graphics, so a patch that forgets them shows up stale
+
+    for where, tile in patches(player.components[Position], map_.components[VisibleTiles]):
+        set_tiles(map_, where, tile)
+        assert (map_.components[Tiles][where] == tile).all()
+        patched = derived_layers(map_, origin)
+
+        # replacing the tiles array rebuilds every derived layer from scratch
+        map_.components[Tiles] = map_.components[Tiles].copy()
+        rebuilt = derived_layers(map_, origin)
+        for name in patched:
+            assert np.array_equal(patched[name], rebuilt[name]), name
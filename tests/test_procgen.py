@@ -0,0 +1,78 @@
+"""The vectorized cave cellular automata must match the per-cell loops they replaced."""
+from __future__ import annotations
+
+import numpy as np
+import pytest
+from numpy.typing import NDArray
+
+from constants.map_constants import CA_MIN_WALLS, CA_MIN_FLOORS
+from dungeon.procgen import cave_first_ca, cave_second_ca, count_neighbors
+from dungeon.tiles import TileIndices
+
+
+def check_neighbors(
+        tiles: NDArray[np.int8],
+        point: tuple[int, int],
+        tile_type: TileIndices,
+        ignore_edges: bool,
+    ) -> int:
+    """The original per-cell neighbour count, kept as the reference."""
+    x, y = point
+    width, height = tiles.shape
+    count = 0
+    for i in (-1, 0, 1):
+        for j in (-1, 0, 1):
+            cur_x, cur_y = x + i, y + j
+            if not ((0 <= cur_x < width) and (0 <= cur_y < height)):
+                if not ignore_edges:
+                    count += 1
+                continue
+            if tiles[cur_x, cur_y] == tile_type:
+                count += 1
+    return count
+
+def reference_ca(tiles: NDArray[np.int8], tile_type: TileIndices, ignore_edges: bool, minimum: int) -> NDArray[np.int8]:
+    """The original CA pass: cells with at least `minimum` neighbours of `tile_type` become it."""
+    output = np.copy(tiles)
+    width, height = tiles.shape
+    for x in range(width):
+        for y in range(height):
+            if check_neighbors(tiles, (x, y), tile_type, ignore_edges) >= minimum:
+                output[x, y] = tile_type
+    return output
+
+def random_grid(seed: int, shape: tuple[int, int] = (37, 23)) -> NDArray[np.int8]:
+    rng = np.random.default_rng(seed)
+    return np.where(rng.random(shape) < 0.45, TileIndices.WALL, TileIndices.FLOOR).astype(np.int8)
+
+
+@pytest.mark.parametrize("seed", range(10))
+@pytest.mark.parametrize("ignore_edges", [True, False])
+@pytest.mark.parametrize("tile_type", [TileIndices.WALL, TileIndices.FLOOR])
+def test_count_neighbors_matches_loop(seed: int, ignore_edges: bool, tile_type: TileIndices) -> None:
+    tiles = random_grid(seed)
+    expected = [[check_neighbors(tiles, (x, y), tile_type, ignore_edges) for y in range(tiles.shape[1])] for x in range(tiles.shape[0])]
+    np.testing.assert_array_equal(count_neighbors(tiles, tile_type, ignore_edges), expected)
+
+@pytest.mark.parametrize("seed", range(10))
+def test_first_ca_matches_loop(seed: int) -> None:
+    tiles = random_grid(seed)
+    np.testing.assert_array_equal(cave_first_ca(tiles), reference_ca(tiles, TileIndices.WALL, False, CA_MIN_WALLS))
+
+@pytest.mark.parametrize("seed", range(10))
+def test_second_ca_matches_loop(seed: int) -> None:
+    tiles = random_grid(seed)
+    np.testing.assert_array_equal(cave_second_ca(tiles), reference_ca(tiles, TileIndices.FLOOR, True, CA_MIN_FLOORS))
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("ignore_edges", [True, False])
+def test_repeated_passes_match_loop(seed: int, ignore_edges: bool) -> None:
+    """Several passes in a row, as `plan_caves` runs them, with either edge rule."""
+    tiles = expected = random_grid(seed)
+    tile_type, minimum, ca = (
+        (TileIndices.FLOOR, CA_MIN_FLOORS, cave_second_ca) if ignore_edges else (TileIndices.WALL, CA_MIN_WALLS, cave_first_ca)
+    )
+    for _ in range(4):
+        tiles = ca(tiles)
+        expected = reference_ca(expected, tile_type, ignore_edges, minimum)
+    np.testing.assert_array_equal(tiles, expected)
@@ -0,0 +1,86 @@
+"""A session recorded the way `main.py` records it must replay exactly with `tools.replay`."""
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+from typing import Iterator
+
+import numpy as np
+import pytest
+import tcod.ecs
+import tcod.event
+import tcod.path
+from tcod.event import KeySym
+
+import tools.replay
+from components.main import Depth, HP, Position, Tiles
+from constants.controls import MOVEMENT_KEYS
+from constants.tags import InMap, IsPlayer
+from dungeon.tiles import TILES, TileIndices
+from engine.level_helpers import start_pool, shutdown_pool, pregenerate_first_level, take_first_level
+from engine.render_helpers import camera_origin
+from engine.replay_helpers import Recorder
+from engine.state import State
+from engine.states import DefaultState
+from engine.world_helpers import build_world
+from tools.headless import key_event
+
+SEED = 4
+DESCENTS = 2 # levels below the first come from the dungeon seed, so go down far enough to build them
+EVENT_LIMIT = 2000
+
+STEP_KEYS = {step: sym for sym, step in MOVEMENT_KEYS.items() if sym.name.startswith("KP_")}
+DESCEND = tcod.event.KeyDown(scancode=0, sym=KeySym.PERIOD, mod=tcod.event.Modifier.LSHIFT)
+
+
+def player_events(world: tcod.ecs.Registry) -> Iterator[tcod.event.Event]:
+    """Yield the events of a player who explores a little, clicks, then heads down the stairs."""
+    (player,) = world.Q.all_of(tags=[IsPlayer])
+    yield key_event(KeySym.o)
+    map_ = player.relation_tag[InMap]
+    pos = player.components[Position]
+    ox, oy = camera_origin(map_, pos)
+    yield tcod.event.MouseButtonDown(pixel=(pos.x - ox + 2, pos.y - oy), tile=(pos.x - ox + 2, pos.y - oy), button=tcod.event.MouseButton.LEFT)
+    yield key_event(KeySym.r)
+    while True:
+        if player.components[HP] < 10:
+            yield key_event(KeySym.F3)
+        map_ = player.relation_tag[InMap]
+        pos = player.components[Position]
+        tiles = map_.components[Tiles]
+        if tiles[pos.raw] == TileIndices.DOWN_STAIRS:
+            yield DESCEND
+            continue
+        # walk the shortest path to the stairs, attacking whatever stands in the way
+        (stairs,) = np.argwhere(tiles == TileIndices.DOWN_STAIRS).tolist()
+        path = tcod.path.path2d(TILES["walk_cost"][tiles], start_points=[pos.raw], end_points=[stairs], cardinal=2, diagonal=3)
+        step = (int(path[1][0]) - pos.x, int(path[1][1]) - pos.y)
+        yield key_event(STEP_KEYS[step])
+
+def record_session(path: Path) -> int:
+    """Play a game built through the level worker, as `main.py` builds it, recording it to `path`. Return the depth reached."""
+    start_pool()
+    try:
+        world = build_world(*take_first_level(SEED, pregenerate_first_level(SEED)))
+        recorder = Recorder(str(path), SEED)
+        state: State = DefaultState(world)
+        (player,) = world.Q.all_of(tags=[IsPlayer])
+        for event, _ in zip(player_events(world), range(EVENT_LIMIT)):
+            state = state.on_event(event) or state
+            recorder.record(event, world)
+            if player.relation_tag[InMap].components[Depth] > DESCENTS:
+                break
+        recorder.close()
+        depth: int = player.relation_tag[InMap].components[Depth]
+        return depth
+    finally:
+        shutdown_pool()
+
+
+def test_replay_matches_game_recording(tmp_path: Path, monkeypatch: pytest.MonkeyPatch, capsys: pytest.CaptureFixture[str]) -> None:
+    recording = tmp_path / "session.rec"
+    assert record_session(recording) > DESCENTS
+    # tools.replay exits with status 1 at the first event whose checksum doesn't match
+    monkeypatch.setattr(sys, "argv", ["replay", str(recording)])
+    tools.replay.main()
+    assert "Replayed" in capsys.readouterr().out
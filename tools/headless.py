@@ -0,0 +1,129 @@
+"""Drive the game without a window.
+
+The world is built with `engine.world_helpers.new_world`, the same way `main.py`
+builds it, and key events are fed straight into the current state's `on_event`.
+"""
+from __future__ import annotations
+
+import time
+from contextlib import contextmanager
+from itertools import cycle
+from random import Random
+from typing import Callable, Iterable, Iterator
+
+import numpy as np
+import tcod.ecs
+import tcod.event
+from tcod.event import KeySym
+
+from engine.state import State
+from engine.states import DefaultState, GameOverState
+from engine.world_helpers import new_world
+import actions.actions
+import actions.action_helpers
+from constants.controls import MOVEMENT_KEYS, WAIT_KEYS
+
+
+PHASES = ("player", "enemies", "fov")
+
+# keys a random player may press: movement, waiting and picking up items
+RANDOM_KEYS = [*MOVEMENT_KEYS, *WAIT_KEYS, KeySym.g]
+
+
+def key_event(sym: KeySym) -> tcod.event.KeyDown:
+    """Return a key press event for `sym`, as tcod would deliver it."""
+    return tcod.event.KeyDown(scancode=0, sym=sym, mod=tcod.event.Modifier.NONE)
+
+def random_keys(seed: int) -> Iterator[tcod.event.KeyDown]:
+    """Yield an endless stream of random gameplay key presses."""
+    rng = Random(seed)
+    while True:
+        yield key_event(rng.choice(RANDOM_KEYS))
+
+def scripted_keys(names: Iterable[str]) -> Iterator[tcod.event.KeyDown]:
+    """Yield the named keys (`KeySym` member names, e.g. "UP" or "KP_5") in a loop."""
+    syms = [KeySym[name] for name in names]
+    if not syms:
+        raise ValueError("A key script needs at least one key.")
+    for sym in cycle(syms):
+        yield key_event(sym)
+
+
+class TurnTimer:
+    """Collects per-turn latency, split into player action, enemy actions and FOV.
+
+    The player phase is the time spent handling the event minus the other two phases."""
+    def __init__(self) -> None:
+        self.samples: dict[str, list[float]] = {phase: [] for phase in PHASES}
+        self._current: dict[str, float] = dict.fromkeys(PHASES, 0.0)
+
+    def _timed(self, phase: str, func: Callable) -> Callable:
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self._current[phase] += time.perf_counter() - start
+        return wrapper
+
+    @contextmanager
+    def patched(self) -> Iterator[None]:
+        """Wrap `do_enemy_actions` and `update_fov` with timers for the duration of the block."""
+        enemy_actions = actions.action_helpers.do_enemy_actions
+        update_fov = actions.actions.update_fov
+        actions.action_helpers.do_enemy_actions = self._timed("enemies", enemy_actions)
+        actions.actions.update_fov = self._timed("fov", update_fov)
+        try:
+            yield
+        finally:
+            actions.action_helpers.do_enemy_actions = enemy_actions
+            actions.actions.update_fov = update_fov
+
+    def handle(self, state: State, event: tcod.event.Event) -> State:
+        """Pass `event` to `state`, recording how long each phase took."""
+        self._current = dict.fromkeys(PHASES, 0.0)
+        start = time.perf_counter()
+        new_state = state.on_event(event)
+        total = time.perf_counter() - start
+        self.samples["player"].append(total - self._current["enemies"] - self._current["fov"])
+        self.samples["enemies"].append(self._current["enemies"])
+        self.samples["fov"].append(self._current["fov"])
+        return state if new_state is None else new_state
+
+    def percentiles(self, q: Iterable[float] = (50, 90, 99)) -> dict[str, dict[str, float]]:
+        """Return per-phase latency statistics in milliseconds."""
+        q = list(q)
+        report: dict[str, dict[str, float]] = {}
+        for phase, samples in self.samples.items():
+            ms = np.asarray(samples or [0.0]) * 1000
+            stats = {f"p{p:g}": float(v) for p, v in zip(q, np.percentile(ms, q))}
+            stats["mean"] = float(ms.mean())
+            stats["max"] = float(ms.max())
+            report[phase] = stats
+        return report
+
+
+def run_turns(
+        events: Iterator[tcod.event.Event],
+        turns: int,
+        seed: int,
+        timer: TurnTimer | None = None,
+        **world_kwargs,
+) -> tuple[tcod.ecs.Registry, int]:
+    """Feed `turns` events to a new game. When the player dies, start over on the next seed.
+
+    Extra keyword arguments are passed to `new_world`.
+    Returns the last world and the number of games played."""
+    timer = timer or TurnTimer()
+    world = new_world(seed, **world_kwargs)
+    state: State = DefaultState(world)
+    games = 1
+    with timer.patched():
+        for _, event in zip(range(turns), events):
+            state = timer.handle(state, event)
+            if isinstance(state, GameOverState):
+                seed += 1
+                games += 1
+                world = new_world(seed, **world_kwargs)
+                state = DefaultState(world)
+    return world, games
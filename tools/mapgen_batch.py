@@ -0,0 +1,169 @@
+"""Generate many cave levels in parallel and report layout statistics.
+
+Each seed is planned with `dungeon.procgen.plan_caves` in a worker process,
+the same way the game plans a level, without building it into a registry.
+Run from the repository root, e.g.:
+
+    python -m tools.mapgen_batch --count 2000 --csv stats.csv --dump maps/
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from random import Random
+from typing import Any
+
+import numpy as np
+import scipy.ndimage as ndi
+
+from constants.map_constants import (
+    MAP_WIDTH,
+    MAP_HEIGHT,
+    ROOM_MAX_SIZE,
+    ROOM_MIN_SIZE,
+    MAX_ROOMS,
+    MAX_MONSTERS_PER_ROOM,
+)
+from dungeon.procgen import LevelPlan, ndimage, plan_caves
+from dungeon.tiles import TILES, TileIndices
+
+
+FIELDS = (
+    "seed",
+    "floor_ratio",
+    "regions",
+    "reachable_ratio",
+    "stairs_reachable",
+    "monsters",
+    "items",
+    "gen_ms",
+)
+
+# 8-connected, like the region labelling in plan_caves
+CONNECTIVITY = np.ones((3, 3), dtype=bool)
+
+
+def layout_stats(plan: LevelPlan) -> dict[str, Any]:
+    """Return floor, connectivity and spawn statistics for a planned level."""
+    walkable = TILES["walk_cost"][plan.tiles] != 0
+    labelled, regions = ndi.label(walkable, structure=CONNECTIVITY)
+    start_region = labelled[plan.player_start]
+    reachable = labelled == start_region
+    stairs = np.argwhere(plan.tiles == TileIndices.DOWN_STAIRS)
+    return {
+        "floor_ratio": float(walkable.mean()),
+        "regions": int(regions),
+        "reachable_ratio": float(reachable.sum() / max(int(walkable.sum()), 1)),
+        "stairs_reachable": bool(all(reachable[tuple(pos)] for pos in stairs)),
+        "monsters": len(plan.monsters),
+        "items": len(plan.items),
+    }
+
+def generate_one(
+        seed: int,
+        map_width: int,
+        map_height: int,
+        room_max_size: int,
+        room_min_size: int,
+        max_rooms: int,
+        max_monsters_per_room: int,
+        depth: int,
+        dump_dir: str | None,
+) -> dict[str, Any]:
+    """Plan the level for `seed` and return its statistics. Runs in a worker process."""
+    start = time.perf_counter()
+    plan = plan_caves(
+        Random(seed),
+        map_width,
+        map_height,
+        room_max_size,
+        room_min_size,
+        max_rooms,
+        max_monsters_per_room,
+        depth,
+    )
+    elapsed = time.perf_counter() - start
+    if dump_dir is not None:
+        np.save(os.path.join(dump_dir, f"{seed}.npy"), plan.tiles)
+    return {"seed": seed, **layout_stats(plan), "gen_ms": elapsed * 1000}
+
+
+def warm_up() -> None:
+    """Do the imports level planning defers, so they don't land in the gen_ms of a worker's first map.
+
+    Runs once in each worker process before it plans anything."""
+    ndimage()
+    import scipy.sparse.csgraph # see dungeon.procgen.connect_regions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Generate cave levels in parallel and report layout statistics.")
+    parser.add_argument("--count", type=int, default=1000, help="number of maps to generate")
+    parser.add_argument("--seed", type=int, default=0, help="first seed, the others follow consecutively")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="worker processes")
+    parser.add_argument("--map-width", type=int, default=MAP_WIDTH)
+    parser.add_argument("--map-height", type=int, default=MAP_HEIGHT)
+    parser.add_argument("--room-max", type=int, default=ROOM_MAX_SIZE)
+    parser.add_argument("--room-min", type=int, default=ROOM_MIN_SIZE)
+    parser.add_argument("--max-rooms", type=int, default=MAX_ROOMS)
+    parser.add_argument("--monsters", type=int, default=MAX_MONSTERS_PER_ROOM, help="max monsters per room")
+    parser.add_argument("--depth", type=int, default=1)
+    parser.add_argument("--csv", help="write per-map statistics to this file ('-' for stdout)")
+    parser.add_argument("--dump", help="save every map's tiles as <seed>.npy in this directory")
+    args = parser.parse_args()
+
+    if args.dump:
+        os.makedirs(args.dump, exist_ok=True)
+    task = partial(
+        generate_one,
+        map_width=args.map_width,
+        map_height=args.map_height,
+        room_max_size=args.room_max,
+        room_min_size=args.room_min,
+        max_rooms=args.max_rooms,
+        max_monsters_per_room=args.monsters,
+        depth=args.depth,
+        dump_dir=args.dump,
+    )
+    seeds = range(args.seed, args.seed + args.count)
+    # a few chunks per worker keeps scheduling overhead low while still balancing the load
+    chunksize = max(1, args.count // (args.workers * 4))
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=warm_up) as pool:
+        rows = list(pool.map(task, seeds, chunksize=chunksize))
+    elapsed = time.perf_counter() - start
+
+    if args.csv:
+        out = sys.stdout if args.csv == "-" else open(args.csv, "w", newline="")
+        try:
+            writer = csv.DictWriter(out, fieldnames=FIELDS)
+            writer.writeheader()
+            writer.writerows(rows)
+        finally:
+            if out is not sys.stdout:
+                out.close()
+
+    print(
+        f"{args.count} maps of {args.map_width}x{args.map_height} on {args.workers} worker(s) in {elapsed:.2f}s"
+        f" ({args.count / elapsed:.1f} maps/s)",
+        file=sys.stderr,
+    )
+    print(f"{'stat':<18}{'mean':>10}{'p5':>10}{'p50':>10}{'p95':>10}{'min':>10}{'max':>10}", file=sys.stderr)
+    for field in FIELDS[1:]:
+        values = np.asarray([row[field] for row in rows], dtype=np.float64)
+        p5, p50, p95 = np.percentile(values, (5, 50, 95))
+        print(
+            f"{field:<18}{values.mean():>10.3f}{p5:>10.3f}{p50:>10.3f}{p95:>10.3f}{values.min():>10.3f}{values.max():>10.3f}",
+            file=sys.stderr,
+        )
+
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Replay a recorded session headlessly, as fast as possible, checking it turn by turn.
+
+Run from the repository root, e.g.:
+
+    python -m tools.replay session.rec
+
+Exits with status 1 at the first event after which the world no longer
+matches the recording, so recordings double as regression tests.
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+import traceback
+
+import tcod.ecs
+import tcod.event
+
+from engine.state import State
+from engine.states import DefaultState
+from engine.messaging import add_message
+from engine.world_helpers import new_world
+from engine.replay_helpers import read_recording, world_checksum
+from tools.headless import PHASES, TurnTimer
+
+
+
+def replay_event(timer: TurnTimer, state: State, world: tcod.ecs.Registry, event) -> State:
+    """Handle `event` the way `main.py` does, without letting a recorded quit end the replay."""
+    try:
+        return timer.handle(state, event)
+    except SystemExit:
+        # the player quit (and saved) here; the recording carries on where the save was resumed
+        return state
+    except Exception as err:
+        traceback.print_exc()
+        add_message(world, f"{str(err)}", "RED")
+        return state
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Replay a recorded session and verify it turn by turn.")
+    parser.add_argument("recording", help="recording file written by main.py")
+    parser.add_argument("--no-verify", action="store_true", help="only time the replay, ignore checksums")
+    args = parser.parse_args()
+
+    seed, events = read_recording(args.recording)
+    world = new_world(seed)
+    state: State = DefaultState(world)
+    timer = TurnTimer()
+
+    start = time.perf_counter()
+    with timer.patched():
+        for turn, (event, expected) in enumerate(events):
+            state = replay_event(timer, state, world, event)
+            if not args.no_verify and world_checksum(world) != expected:
+                what = event.sym.name if isinstance(event, tcod.event.KeyDown) else f"click at {event.position}"
+                print(f"Diverged at event {turn} ({what}): the world no longer matches the recording.")
+                sys.exit(1)
+    elapsed = time.perf_counter() - start
+
+    print(f"Replayed {len(events)} events from seed {seed} in {elapsed:.2f}s ({len(events) / max(elapsed, 1e-9):.0f}/s)")
+    report = timer.percentiles()
+    columns = list(report[PHASES[0]])
+    print(f"{'phase (ms)':<12}" + "".join(f"{c:>10}" for c in columns))
+    for phase in PHASES:
+        print(f"{phase:<12}" + "".join(f"{report[phase][c]:>10.3f}" for c in columns))
+
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Report where the game spends its time before the first frame.
+
+Imports are timed in a fresh interpreter with `python -X importtime`, the
+same way they happen when `main.py` starts. Loading the tileset and planning
+and building the first level are timed in this process. Run from the
+repository root, e.g.:
+
+    python -m tools.startup_report --top 15 --budget-ms 500
+
+With `--budget-ms`, the exit status is 1 when importing `main` takes longer,
+so an import-time regression fails a scripted check.
+"""
+from __future__ import annotations
+
+import argparse
+import subprocess
+import sys
+import time
+from typing import Callable, TypeVar
+
+T = TypeVar("T")
+
+# imported on first use, so they must not show up when `main` is imported
+DEFERRED_MODULES = ("scipy",)
+
+
+def import_times(module: str) -> list[tuple[str, int, int, int]]:
+    """Import `module` in a fresh interpreter and return (name, depth, self us, cumulative us) per import, in order."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times: list[tuple[str, int, int, int]] = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line.removeprefix("import time:").split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        times.append((name.strip(), depth, int(self_us), int(cumulative_us)))
+    return times
+
+def timed_call(func: Callable[[], T]) -> tuple[T, float]:
+    """Return the result of `func()` and how long it took, in milliseconds."""
+    start = time.perf_counter()
+    result = func()
+    return result, (time.perf_counter() - start) * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Report import and startup times of the game.")
+    parser.add_argument("--top", type=int, default=10, help="number of slowest modules to list")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first level to plan")
+    parser.add_argument("--budget-ms", type=float, help="fail if importing main takes longer than this")
+    args = parser.parse_args()
+
+    times = import_times("main")
+    end = next(i for i, (name, depth, *_) in enumerate(times) if name == "main" and depth == 0)
+    total_us = times[end][3]
+    # imports are listed after everything they import, so main's own imports come right before it
+    start = max((i + 1 for i, (_, depth, *_) in enumerate(times[:end]) if depth == 0), default=0)
+    children = [(name, cumulative) for name, depth, _, cumulative in times[start:end] if depth == 1]
+    print(f"import main: {total_us / 1000:.1f} ms")
+    print(f"  {'imported by main':<40}{'cumulative ms':>14}")
+    for name, cumulative in sorted(children, key=lambda t: -t[1])[: args.top]:
+        print(f"  {name:<40}{cumulative / 1000:>14.1f}")
+    print(f"  {'slowest modules':<40}{'self ms':>14}")
+    for name, _, self_us, _ in sorted(times, key=lambda t: -t[2])[: args.top]:
+        print(f"  {name:<40}{self_us / 1000:>14.1f}")
+    deferred = sorted({name.split(".")[0] for name, *_ in times} & set(DEFERRED_MODULES))
+    if deferred:
+        print(f"  WARNING: {', '.join(deferred)} imported eagerly")
+
+    import tcod.tileset
+    from constants.game_constants import FONT_PATH, FONT_COLS, FONT_ROWS
+    from engine.level_helpers import plan_first_level
+    from engine.world_helpers import build_world
+
+    _, tileset_ms = timed_call(
+        lambda: tcod.tileset.load_tilesheet(FONT_PATH, FONT_COLS, FONT_ROWS, tcod.tileset.CHARMAP_CP437)
+    )
+    (plan, rng), plan_ms = timed_call(lambda: plan_first_level(args.seed))
+    _, build_ms = timed_call(lambda: build_world(plan, rng, pregenerate=False))
+    print(f"load tileset: {tileset_ms:.1f} ms")
+    print(f"plan first level: {plan_ms:.1f} ms (in the worker, while the window is already open)")
+    print(f"build first level: {build_ms:.1f} ms")
+
+    if args.budget_ms is not None and total_us / 1000 > args.budget_ms:
+        print(f"import main took longer than the {args.budget_ms:.0f} ms budget", file=sys.stderr)
+        sys.exit(1)
+
+
+
+if __name__ == "__main__":
+    main()
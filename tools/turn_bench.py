@@ -0,0 +1,55 @@
+"""Headless turn-latency benchmark.
+
+Run from the repository root, e.g.:
+
+    python -m tools.turn_bench --turns 5000 --map-width 160 --map-height 90 --monsters 4
+"""
+from __future__ import annotations
+
+import argparse
+import time
+
+from constants.map_constants import MAP_WIDTH, MAP_HEIGHT, MAX_ROOMS, MAX_MONSTERS_PER_ROOM
+from tools.headless import PHASES, TurnTimer, random_keys, scripted_keys, run_turns
+
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run the game headlessly and report per-turn latency.")
+    parser.add_argument("--turns", type=int, default=2000, help="number of key events to feed")
+    parser.add_argument("--seed", type=int, default=0, help="world seed (also seeds random input)")
+    parser.add_argument("--map-width", type=int, default=MAP_WIDTH)
+    parser.add_argument("--map-height", type=int, default=MAP_HEIGHT)
+    parser.add_argument("--max-rooms", type=int, default=MAX_ROOMS)
+    parser.add_argument("--monsters", type=int, default=MAX_MONSTERS_PER_ROOM, help="max monsters per room")
+    parser.add_argument("--chunked", action="store_true", help="play on the chunked overworld instead of caves")
+    parser.add_argument("--script", help="comma-separated KeySym names to press in a loop, e.g. UP,UP,LEFT,PERIOD")
+    args = parser.parse_args()
+
+    events = scripted_keys(args.script.split(",")) if args.script else random_keys(args.seed)
+    timer = TurnTimer()
+    start = time.perf_counter()
+    _, games = run_turns(
+        events,
+        args.turns,
+        args.seed,
+        timer,
+        map_width=args.map_width,
+        map_height=args.map_height,
+        max_rooms=args.max_rooms,
+        max_monsters_per_room=args.monsters,
+        chunked=args.chunked,
+    )
+    elapsed = time.perf_counter() - start
+
+    print(f"{args.turns} turns on a {args.map_width}x{args.map_height} map, {games} game(s), {elapsed:.2f}s total")
+    report = timer.percentiles()
+    columns = list(report[PHASES[0]])
+    print(f"{'phase (ms)':<12}" + "".join(f"{c:>10}" for c in columns))
+    for phase in PHASES:
+        print(f"{phase:<12}" + "".join(f"{report[phase][c]:>10.3f}" for c in columns))
+
+
+
+if __name__ == "__main__":
+    main()